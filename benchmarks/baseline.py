@@ -0,0 +1,57 @@
+import json
+import os
+
+# Results are {"results": {name: {metric: value}}}. A result regresses when a
+# lower-is-better metric grows, or a higher-is-better one shrinks, by more
+# than the tolerance relative to the stored baseline.
+
+LOWER_IS_BETTER = {"ns_per_op", "p50_ms", "p95_ms", "p99_ms"}
+HIGHER_IS_BETTER = {"throughput_rps"}
+DEFAULT_TOLERANCE = 0.2
+
+def load(path: str) -> dict | None:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as source:
+        return json.load(source)
+
+def save(path: str, report: dict):
+    with open(path, "w", encoding="utf-8") as target:
+        json.dump(report, target, indent=2, sort_keys=True)
+        target.write("\n")
+
+def compare(report: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    regressions = []
+    for name, metrics in report["results"].items():
+        previous = baseline["results"].get(name)
+        if not previous:
+            continue
+        for metric, value in metrics.items():
+            before = previous.get(metric)
+            if not before:
+                continue
+            change = (value - before) / before
+            if (metric in LOWER_IS_BETTER and change > tolerance) or (metric in HIGHER_IS_BETTER and change < -tolerance):
+                regressions.append({"name": name, "metric": metric, "baseline": before, "current": value, "change": round(change, 3)})
+    return regressions
+
+def finish(report: dict, args) -> int:
+    """Write the report, compare it with the baseline and return an exit code."""
+    if args.save_baseline:
+        save(args.baseline, report)
+    baseline = None if args.save_baseline else load(args.baseline)
+    if baseline is not None:
+        report["regressions"] = compare(report, baseline, args.tolerance)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as target:
+            target.write(output + "\n")
+    print(output)
+    return 1 if report.get("regressions") else 0
+
+def add_arguments(parser, default_baseline: str):
+    parser.add_argument("--output", help="also write the JSON report here")
+    parser.add_argument("--baseline", default=default_baseline, help="baseline file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed relative slowdown")
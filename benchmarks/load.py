@@ -0,0 +1,175 @@
+import argparse
+import asyncio
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+import httpx
+from benchmarks import baseline
+from benchmarks.seed import PASSWORD, email
+from db import MONGO_DB_NAME, async_courses_collection, async_enrollments_collection, async_users_collection
+from main import app
+
+# Load test against the ASGI app in-process, over a database filled by
+# benchmarks.seed. Requests go through httpx's ASGI transport, so the full
+# middleware, dependency and serialization stack is exercised without a
+# network hop. Each scenario runs on its own: --requests calls spread over
+# --concurrency workers, reporting throughput and latency percentiles.
+#
+# The contention scenario is the exception. --login-concurrency workers log
+# in nonstop, which is more than BCRYPT_WORKERS + BCRYPT_MAX_QUEUE can take,
+# while a scenario that never hashes runs beside them. It reports how many
+# logins were turned away with a 503 and what the login storm costs the
+# other endpoint, next to that endpoint's own result run alone.
+
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret-key-benchmark-secret-key")
+os.environ.setdefault("REMINDER_DISPATCHER", "off")
+os.environ.setdefault("PROPAGATION_WORKER", "off")
+os.environ.setdefault("IMPORT_WORKER", "off")
+
+CONTENTION = ("users.login", "users.profile")
+
+def percentile(latencies: list, fraction: float) -> float:
+    index = min(len(latencies) - 1, max(0, round(fraction * len(latencies)) - 1))
+    return latencies[index]
+
+async def login(client: httpx.AsyncClient, address: str) -> dict:
+    response = await client.post("/users/login", json={"email": address, "password": PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+async def fixtures(client: httpx.AsyncClient) -> dict:
+    tutor = await async_users_collection.find_one({"email": email("tutor", 0)}, {"_id": 1})
+    course = tutor and await async_courses_collection.find_one({"tutor_id": str(tutor["_id"])}, {"_id": 1})
+    if not course:
+        sys.exit(f"{MONGO_DB_NAME} has no seeded courses; run python -m benchmarks.seed first")
+    enrollment = await async_enrollments_collection.find_one(
+        {"course_id": str(course["_id"]), "status": "active"}, {"learner_id": 1}
+    )
+    return {
+        "course_id": str(course["_id"]),
+        "learner_id": enrollment["learner_id"] if enrollment else None,
+        "admin": await login(client, email("admin")),
+        "tutor": await login(client, email("tutor", 0)),
+        "learner": await login(client, email("learner", 0)),
+    }
+
+def scenarios(data: dict) -> list:
+    """(name, role or None, method, path, keyword arguments for httpx)."""
+    course_id = data["course_id"]
+    return [
+        ("users.login", None, "POST", "/users/login", {"json": {"email": email("learner", 1), "password": PASSWORD}}),
+        ("users.profile", "learner", "GET", "/users/profile", {}),
+        ("courses.list", None, "GET", "/courses", {}),
+        ("courses.list_category", None, "GET", "/courses", {"params": {"category": "Science"}}),
+        ("courses.search", None, "GET", "/courses", {"params": {"search": "applied statistics"}}),
+        ("courses.my_courses_learner", "learner", "GET", "/courses/my-courses", {}),
+        ("courses.my_courses_tutor", "tutor", "GET", "/courses/my-courses", {}),
+        ("courses.tutor", None, "GET", f"/courses/{course_id}/tutor", {}),
+        ("resources.course", "tutor", "GET", f"/resources/course/{course_id}", {}),
+        ("calendar.events", "learner", "GET", "/calendar/events", {}),
+        ("attendance.my_learner", "learner", "GET", "/attendance/my-attendance", {}),
+        ("attendance.my_tutor", "tutor", "GET", "/attendance/my-attendance", {}),
+        ("attendance.course", "tutor", "GET", f"/attendance/course/{course_id}", {}),
+        ("attendance.course_stats", "tutor", "GET", f"/attendance/course/{course_id}/stats", {}),
+        ("attendance.my_stats", "learner", "GET", "/attendance/my-stats", {}),
+        ("attendance.bulk_checkin", "tutor", "POST", f"/attendance/checkin/{course_id}/bulk",
+            {"json": {"learner_ids": [data["learner_id"]] if data["learner_id"] else ["0" * 24]}}),
+        ("announcements.feed", "learner", "GET", "/announcements/feed", {}),
+        ("announcements.unread_count", "learner", "GET", "/announcements/unread-count", {}),
+        ("announcements.create", "tutor", "POST", "/announcements",
+            {"data": {"title": "Benchmark", "content": "Load test announcement", "course_id": course_id}}),
+    ]
+
+async def run_scenario(client: httpx.AsyncClient, method: str, path: str, headers: dict, kwargs: dict,
+                       requests: int, concurrency: int, stop: asyncio.Event | None = None) -> dict:
+    """Make `requests` calls, or keep calling until `stop` is set when one is given."""
+    latencies = []
+    errors = 0
+    rejected = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors, rejected
+        while not stop.is_set() if stop else remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await client.request(method, path, headers=headers, **kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code == 503:
+                rejected += 1
+            elif response.status_code >= 400:
+                errors += 1
+            # A 503 can complete without suspending; let the other workers run
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rejected": rejected,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+    }
+
+async def run_contention(client: httpx.AsyncClient, data: dict, args) -> dict:
+    """Logins past the bcrypt pool's capacity for as long as the other scenario runs."""
+    requests = {}
+    for name, role, method, path, kwargs in scenarios(data):
+        if name in CONTENTION:
+            requests[name] = (method, path, data[role] if role else {}, kwargs)
+    stop = asyncio.Event()
+
+    async def measured():
+        try:
+            return await run_scenario(client, *requests[CONTENTION[1]], args.requests, args.concurrency)
+        finally:
+            stop.set()
+
+    logins, other = await asyncio.gather(
+        run_scenario(client, *requests[CONTENTION[0]], 0, args.login_concurrency, stop),
+        measured(),
+    )
+    return {f"contention.{CONTENTION[0]}": logins, f"contention.{CONTENTION[1]}": other}
+
+async def run(args) -> dict:
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            data = await fixtures(client)
+            for name, role, method, path, kwargs in scenarios(data):
+                if args.only and not any(name.startswith(prefix) for prefix in args.only):
+                    continue
+                headers = data[role] if role else {}
+                # A short warm-up fills caches and pools before timing
+                await run_scenario(client, method, path, headers, kwargs, min(args.concurrency, args.requests), 1)
+                results[name] = await run_scenario(client, method, path, headers, kwargs, args.requests, args.concurrency)
+            if not args.only or "contention" in args.only:
+                results.update(await run_contention(client, data, args))
+    return {
+        "kind": "load",
+        "database": MONGO_DB_NAME,
+        "python": platform.python_version(),
+        "concurrency": args.concurrency,
+        "login_concurrency": args.login_concurrency,
+        "created_at": datetime.now(tz=timezone.utc).isoformat(),
+        "results": results,
+    }
+
+if __name__ == "__main__":
+    # Usage: MONGO_DB_NAME=bridgelms_bench python -m benchmarks.load [--concurrency 32 --requests 500 --only courses contention]
+    parser = argparse.ArgumentParser(description="Drive every router through the ASGI app and report latency percentiles")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--login-concurrency", type=int, default=128, help="workers logging in during the contention scenario")
+    parser.add_argument("--only", nargs="*", help="scenario name prefixes to run, e.g. courses attendance")
+    baseline.add_arguments(parser, os.path.join(os.path.dirname(__file__), "baseline-load.json"))
+    args = parser.parse_args()
+    sys.exit(baseline.finish(asyncio.run(run(args)), args))
@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from benchmarks import baseline
+from benchmarks.load import percentile
+from benchmarks.seed import _insert, seed_courses, seed_users
+from db import MONGO_DB_NAME, async_courses_collection, bridgelms_db, courses_collection
+from indexes import ensure_indexes
+from route.courses import find_courses
+from services.search import query_tokens
+
+# Catalog search over a large synthetic catalog (100k courses by default).
+# Queries call find_courses directly, so the response cache never answers
+# for them, and each reports latency percentiles over --repeats runs. Seeded
+# titles and descriptions draw on benchmarks.seed.WORDS, so single words
+# match a large share of the catalog and exercise the candidate cap.
+
+QUERIES = {
+    "single_word": "statistics",
+    "two_words": "applied statistics",
+    "prefix": "stat",
+    "typo": "statistcs",
+    "three_words": "advanced python databases",
+    "no_match": "zzzz",
+}
+
+async def seed_catalog(count: int):
+    rng = random.Random(42)
+    for name in ["users", "courses"]:
+        bridgelms_db.drop_collection(name)
+    await ensure_indexes()
+    tutors = seed_users(rng, 50, 0)["tutor"]
+    _insert(courses_collection, seed_courses(rng, tutors, count, 60))
+
+async def run(args) -> dict:
+    if args.reseed or await async_courses_collection.count_documents({}) != args.courses:
+        await seed_catalog(args.courses)
+
+    results = {}
+    for name, search in QUERIES.items():
+        tokens = query_tokens(search)
+        latencies = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            await find_courses({"is_active": True}, tokens, 20, None)
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        results[name] = {
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+        }
+    return {
+        "kind": "search",
+        "database": MONGO_DB_NAME,
+        "courses": args.courses,
+        "python": platform.python_version(),
+        "created_at": datetime.now(tz=timezone.utc).isoformat(),
+        "results": results,
+    }
+
+if __name__ == "__main__":
+    # Usage: MONGO_DB_NAME=bridgelms_bench python -m benchmarks.search [--courses 100000 --reseed]
+    parser = argparse.ArgumentParser(description="Time catalog search over a large synthetic catalog")
+    parser.add_argument("--courses", type=int, default=100_000)
+    parser.add_argument("--repeats", type=int, default=50, help="runs per query")
+    parser.add_argument("--reseed", action="store_true", help="rebuild the catalog even if its size matches")
+    parser.add_argument("--force", action="store_true", help="allow seeding the default bridgelms_db database")
+    baseline.add_arguments(parser, os.path.join(os.path.dirname(__file__), "baseline-search.json"))
+    args = parser.parse_args()
+    if MONGO_DB_NAME == "bridgelms_db" and not args.force:
+        sys.exit("Refusing to reseed bridgelms_db; set MONGO_DB_NAME to a scratch database or pass --force")
+    sys.exit(baseline.finish(asyncio.run(run(args)), args))
@@ -0,0 +1,260 @@
+import argparse
+import asyncio
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+import bcrypt
+from bson.objectid import ObjectId
+from db import (
+    MONGO_DB_NAME,
+    bridgelms_db,
+    announcements_collection,
+    attendance_collection,
+    courses_collection,
+    enrollments_collection,
+    events_collection,
+    feed_counters_collection,
+    inbox_collection,
+    resources_collection,
+    users_collection,
+)
+from indexes import ensure_indexes
+from services.attendance_stats import attendance_day, backfill
+from services.feed import INBOX_FIELDS
+from services.passwords import BCRYPT_ROUNDS
+from services.search import search_fields
+
+# Synthetic data for benchmarks.
+#
+# Every account shares PASSWORD and a predictable email (admin@bench.local,
+# tutor{i}@bench.local, learner{i}@bench.local) so the load test can log in
+# as any of them. Generation is seeded, so the same arguments always build
+# the same dataset. Attendance covers weekdays only: each course meets with
+# probability --session-rate and each active learner attends with
+# probability --attendance-rate.
+
+PASSWORD = "benchmark-password"
+BENCH_DOMAIN = "bench.local"
+BATCH_SIZE = 10_000
+CATEGORIES = ["Mathematics", "Science", "History", "Languages", "Programming", "Art", "Music", "Business"]
+WORDS = [
+    "introduction", "advanced", "applied", "modern", "foundations", "practical", "theory", "algebra",
+    "biology", "chemistry", "physics", "python", "databases", "writing", "design", "statistics",
+    "economics", "geometry", "literature", "networks", "painting", "harmony", "marketing", "history",
+]
+
+def email(kind: str, index: int | None = None) -> str:
+    return f"{kind}{'' if index is None else index}@{BENCH_DOMAIN}"
+
+def _insert(collection, documents: list):
+    for start in range(0, len(documents), BATCH_SIZE):
+        collection.insert_many(documents[start:start + BATCH_SIZE], ordered=False)
+
+def seed_users(rng: random.Random, tutors: int, learners: int) -> dict:
+    hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=BCRYPT_ROUNDS))
+    now = datetime.now(tz=timezone.utc)
+    accounts = [("admin", None, "admin")]
+    accounts += [("tutor", i, "tutor") for i in range(tutors)]
+    accounts += [("learner", i, "learner") for i in range(learners)]
+    users = [
+        {
+            "_id": ObjectId(),
+            "username": f"{kind.title()} {'' if index is None else index}".strip(),
+            "email": email(kind, index),
+            "password": hashed,
+            "role": role,
+            "phone": f"+1555{rng.randrange(10**6):06d}",
+            "bio": "",
+            "created_at": now,
+        }
+        for kind, index, role in accounts
+    ]
+    _insert(users_collection, users)
+    by_role = {"admin": [], "tutor": [], "learner": []}
+    for user in users:
+        by_role[user["role"]].append(user)
+    return by_role
+
+def seed_courses(rng: random.Random, tutors: list, count: int, max_students: int) -> list:
+    now = datetime.now(tz=timezone.utc)
+    courses = []
+    for i in range(count):
+        tutor = tutors[i % len(tutors)]
+        title = " ".join(word.title() for word in rng.sample(WORDS, 3))
+        description = " ".join(rng.choices(WORDS, k=20))
+        category = rng.choice(CATEGORIES)
+        courses.append({
+            "_id": ObjectId(),
+            "title": title,
+            "description": description,
+            "category": category,
+            "max_students": max_students,
+            "enrolled_count": 0,
+            "is_public": True,
+            "tutor_id": str(tutor["_id"]),
+            "tutor_name": tutor["username"],
+            "created_at": now - timedelta(days=count - i),
+            "is_active": True,
+            **search_fields(title, description, category),
+        })
+    return courses
+
+def seed_enrollments(rng: random.Random, learners: list, courses: list, per_learner: int, years: float) -> list:
+    enrolled_at = datetime.now(tz=timezone.utc) - timedelta(days=int(years * 365) + 1)
+    enrollments = []
+    for learner in learners:
+        for course in rng.sample(courses, min(per_learner, len(courses))):
+            active = course["enrolled_count"] < course["max_students"]
+            course["enrolled_count"] += active
+            enrollments.append({
+                "course_id": str(course["_id"]),
+                "learner_id": str(learner["_id"]),
+                "learner_name": learner["username"],
+                "enrolled_at": enrolled_at,
+                "status": "active" if active else "waitlisted",
+            })
+    return enrollments
+
+def seed_attendance(rng: random.Random, enrollments: list, years: float, session_rate: float, attendance_rate: float) -> int:
+    roster = {}
+    for enrollment in enrollments:
+        if enrollment["status"] == "active":
+            roster.setdefault(enrollment["course_id"], []).append(enrollment)
+
+    today = datetime.now(tz=timezone.utc).replace(hour=9, minute=0, second=0, microsecond=0)
+    days = [today - timedelta(days=offset) for offset in range(1, int(years * 365) + 1)]
+    batch = []
+    inserted = 0
+    for course_id, learners in roster.items():
+        for day in days:
+            if day.weekday() >= 5 or rng.random() >= session_rate:
+                continue
+            for enrollment in learners:
+                if rng.random() < attendance_rate:
+                    moment = day + timedelta(minutes=rng.randrange(30))
+                    batch.append({
+                        "course_id": course_id,
+                        "learner_id": enrollment["learner_id"],
+                        "learner_name": enrollment["learner_name"],
+                        "date": moment,
+                        "day": attendance_day(moment),
+                        "status": "present",
+                    })
+            if len(batch) >= BATCH_SIZE:
+                attendance_collection.insert_many(batch, ordered=False)
+                inserted += len(batch)
+                batch = []
+    if batch:
+        attendance_collection.insert_many(batch, ordered=False)
+        inserted += len(batch)
+    return inserted
+
+def seed_course_content(rng: random.Random, courses: list, enrollments: list, announcements_per_course: int):
+    now = datetime.now(tz=timezone.utc)
+    learners_by_course = {}
+    for enrollment in enrollments:
+        if enrollment["status"] == "active":
+            learners_by_course.setdefault(enrollment["course_id"], []).append(enrollment["learner_id"])
+
+    announcements, inbox, unread, resources, events = [], [], {}, [], []
+    for course in courses:
+        course_id = str(course["_id"])
+        for i in range(announcements_per_course):
+            announcement = {
+                "_id": ObjectId(),
+                "title": f"Update {i + 1} for {course['title']}",
+                "content": " ".join(rng.choices(WORDS, k=40)),
+                "course_id": course_id,
+                "created_by": course["tutor_id"],
+                "created_by_name": course["tutor_name"],
+                "is_important": rng.random() < 0.2,
+                "created_at": now - timedelta(days=rng.randrange(365), minutes=i),
+            }
+            announcements.append(announcement)
+            for learner_id in learners_by_course.get(course_id, []):
+                read = rng.random() < 0.7
+                inbox.append({
+                    "learner_id": learner_id,
+                    "announcement_id": str(announcement["_id"]),
+                    "read": read,
+                    **{field: announcement[field] for field in INBOX_FIELDS},
+                })
+                unread[learner_id] = unread.get(learner_id, 0) + (not read)
+
+        for i in range(3):
+            resources.append({
+                "title": f"Reading {i + 1}",
+                "description": "",
+                "course_id": course_id,
+                "resource_type": "link",
+                "uploaded_by": course["tutor_id"],
+                "uploaded_at": now - timedelta(days=i),
+                "file_url": None,
+                "external_url": f"https://example.com/{course_id}/{i}",
+                "status": "ready",
+            })
+
+        start = now.replace(hour=10, minute=0, second=0, microsecond=0) - timedelta(days=rng.randrange(7))
+        events.append({
+            "title": f"{course['title']} lecture",
+            "description": "",
+            "course_id": course_id,
+            "start": start,
+            "end": start + timedelta(hours=1),
+            "rrule": "FREQ=WEEKLY",
+            "series_end": datetime(9999, 12, 31, tzinfo=timezone.utc),
+            "created_by": course["tutor_id"],
+            "created_at": now,
+            "updated_at": now,
+        })
+
+    _insert(announcements_collection, announcements)
+    _insert(inbox_collection, inbox)
+    _insert(feed_counters_collection, [{"_id": learner_id, "unread": count} for learner_id, count in unread.items()])
+    _insert(resources_collection, resources)
+    _insert(events_collection, events)
+
+def seed(args) -> dict:
+    rng = random.Random(args.seed)
+    for name in bridgelms_db.list_collection_names():
+        bridgelms_db.drop_collection(name)
+    asyncio.run(ensure_indexes())
+
+    users = seed_users(rng, args.tutors, args.learners)
+    courses = seed_courses(rng, users["tutor"], args.courses, args.max_students)
+    enrollments = seed_enrollments(rng, users["learner"], courses, args.enrollments_per_learner, args.years)
+    _insert(courses_collection, courses)
+    _insert(enrollments_collection, enrollments)
+    checkins = seed_attendance(rng, enrollments, args.years, args.session_rate, args.attendance_rate)
+    seed_course_content(rng, courses, enrollments, args.announcements)
+    backfill()
+    return {
+        "database": MONGO_DB_NAME,
+        "users": sum(len(group) for group in users.values()),
+        "courses": len(courses),
+        "enrollments": len(enrollments),
+        "attendance": checkins,
+        "announcements": len(courses) * args.announcements,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Seed a scratch database with synthetic BridgeLMS data")
+    parser.add_argument("--tutors", type=int, default=50)
+    parser.add_argument("--learners", type=int, default=2000)
+    parser.add_argument("--courses", type=int, default=200)
+    parser.add_argument("--max-students", type=int, default=60)
+    parser.add_argument("--enrollments-per-learner", type=int, default=4)
+    parser.add_argument("--years", type=float, default=1.0, help="years of attendance history")
+    parser.add_argument("--session-rate", type=float, default=0.4)
+    parser.add_argument("--attendance-rate", type=float, default=0.8)
+    parser.add_argument("--announcements", type=int, default=10, help="announcements per course")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--force", action="store_true", help="allow seeding the default bridgelms_db database")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    # Usage: MONGO_DB_NAME=bridgelms_bench python -m benchmarks.seed [--learners 2000 --years 2 ...]
+    args = parse_args()
+    if MONGO_DB_NAME == "bridgelms_db" and not args.force:
+        sys.exit("Refusing to drop and reseed bridgelms_db; set MONGO_DB_NAME to a scratch database or pass --force")
+    print(seed(args))
@@ -1,12 +1,25 @@
-from pymongo import MongoClient
+from gridfs import AsyncGridFSBucket
+from pymongo import MongoClient, AsyncMongoClient
 import os
 from dotenv import load_dotenv
+from services.metrics import mongo_listener
 
 load_dotenv()
 
+# Connection pool sizing and command timing, shared by the sync and async clients
+pool_options = {
+    "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+    "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+    "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000")),
+    "event_listeners": [mongo_listener],
+}
+
+# Benchmarks point this at a scratch database
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "bridgelms_db")
+
 # Connect to MongoDB
-mongo_client = MongoClient(os.getenv("MONGO_URI"))
-bridgelms_db = mongo_client["bridgelms_db"]
+mongo_client = MongoClient(os.getenv("MONGO_URI"), **pool_options)
+bridgelms_db = mongo_client[MONGO_DB_NAME]
 
 # Collections
 users_collection = bridgelms_db["users"]
@@ -17,4 +30,40 @@ events_collection = bridgelms_db["events"]
 calendar_collection = bridgelms_db["calendar"]
 attendance_collection = bridgelms_db["attendance"]
 announcements_collection = bridgelms_db["announcements"]
-reminders_collection = bridgelms_db["reminders"]
\ No newline at end of file
+reminders_collection = bridgelms_db["reminders"]
+attendance_daily_collection = bridgelms_db["attendance_daily"]
+attendance_course_stats_collection = bridgelms_db["attendance_course_stats"]
+attendance_learner_stats_collection = bridgelms_db["attendance_learner_stats"]
+derivatives_collection = bridgelms_db["derivatives"]
+blobs_collection = bridgelms_db["blobs"]
+inbox_collection = bridgelms_db["inbox"]
+feed_counters_collection = bridgelms_db["feed_counters"]
+user_courses_collection = bridgelms_db["user_courses"]
+jobs_collection = bridgelms_db["jobs"]
+
+# Async client for `async def` routes
+async_mongo_client = AsyncMongoClient(os.getenv("MONGO_URI"), **pool_options)
+async_bridgelms_db = async_mongo_client[MONGO_DB_NAME]
+
+# Async collections
+async_users_collection = async_bridgelms_db["users"]
+async_courses_collection = async_bridgelms_db["courses"]
+async_enrollments_collection = async_bridgelms_db["enrollments"]
+async_resources_collection = async_bridgelms_db["resources"]
+async_events_collection = async_bridgelms_db["events"]
+async_calendar_collection = async_bridgelms_db["calendar"]
+async_attendance_collection = async_bridgelms_db["attendance"]
+async_announcements_collection = async_bridgelms_db["announcements"]
+async_reminders_collection = async_bridgelms_db["reminders"]
+async_attendance_daily_collection = async_bridgelms_db["attendance_daily"]
+async_attendance_course_stats_collection = async_bridgelms_db["attendance_course_stats"]
+async_attendance_learner_stats_collection = async_bridgelms_db["attendance_learner_stats"]
+async_derivatives_collection = async_bridgelms_db["derivatives"]
+async_blobs_collection = async_bridgelms_db["blobs"]
+async_inbox_collection = async_bridgelms_db["inbox"]
+async_feed_counters_collection = async_bridgelms_db["feed_counters"]
+async_user_courses_collection = async_bridgelms_db["user_courses"]
+async_jobs_collection = async_bridgelms_db["jobs"]
+
+# Uploaded import files wait here until an import worker on any replica reads them
+async_import_files_bucket = AsyncGridFSBucket(async_bridgelms_db, bucket_name="import_files")
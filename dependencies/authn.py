@@ -3,11 +3,43 @@ from typing import Annotated
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 import jwt
-from db import users_collection
-from utils import replace_mongo_id
+from db import async_users_collection
+from utils import replace_mongo_id, TTLCache
 from bson.objectid import ObjectId
 
-def is_authenticated(
+# Authenticated users are served from memory for a short while so that
+# dashboards firing several requests at once don't each hit Mongo.
+user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "30")),
+)
+
+# Tokens carry the user's token_version as "ver". Bumping the stored version
+# (e.g. on a role change) revokes every token minted before it. Versions are
+# cached like users, so claims-only requests never wait on Mongo.
+token_versions = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "30")),
+)
+
+def invalidate_user(user_id: str):
+    user_cache.invalidate(user_id)
+    token_versions.invalidate(user_id)
+
+async def token_version(user_id: str) -> int:
+    version = token_versions.get(user_id)
+    if version is None:
+        user = await async_users_collection.find_one({"_id": ObjectId(user_id)}, {"token_version": 1})
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Authenticated user missing from database!",
+            )
+        version = user.get("token_version", 0)
+        token_versions.set(user_id, version)
+    return version
+
+async def authenticated_claims(
     authorization: Annotated[HTTPAuthorizationCredentials, Depends(HTTPBearer())],
 ):
     try:
@@ -16,15 +48,26 @@ def is_authenticated(
             key=os.getenv("JWT_SECRET_KEY"),
             algorithms=["HS256"],
         )
-        return payload["id"]
     except jwt.InvalidTokenError as e:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
+    if payload.get("ver", 0) != await token_version(payload["id"]):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has been revoked")
+    return {"id": payload["id"], "role": payload["role"]}
 
-def authenticated_user(user_id: Annotated[str, Depends(is_authenticated)]):
-    user = users_collection.find_one(filter={"_id": ObjectId(user_id)})
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authenticated user missing from database!",
-        )
-    return replace_mongo_id(user)
\ No newline at end of file
+def is_authenticated(claims: Annotated[dict, Depends(authenticated_claims)]):
+    return claims["id"]
+
+async def authenticated_user(user_id: Annotated[str, Depends(is_authenticated)]):
+    user = user_cache.get(user_id)
+    if user is None:
+        # The password hash never leaves login, so it isn't loaded or cached here
+        user = await async_users_collection.find_one(filter={"_id": ObjectId(user_id)}, projection={"password": 0})
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Authenticated user missing from database!",
+            )
+        user = replace_mongo_id(user)
+        user_cache.set(user_id, user)
+    # Hand out a copy so handlers can't mutate the cached document
+    return dict(user)
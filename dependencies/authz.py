@@ -1,4 +1,4 @@
-from dependencies.authn import authenticated_user
+from dependencies.authn import authenticated_claims, authenticated_user
 from fastapi import Depends, HTTPException, status
 from typing import Annotated
 from enum import Enum
@@ -39,22 +39,38 @@ permissions = [
     }
 ]
 
+# Compiled once so every check is a single set membership test
+ROLE_PERMISSIONS = {entry["role"]: frozenset(entry["permissions"]) for entry in permissions}
+
+def roles_with_permission(permission) -> frozenset:
+    return frozenset(
+        role for role, granted in ROLE_PERMISSIONS.items()
+        if "*" in granted or permission in granted
+    )
+
 def has_roles(roles):
-    def check_roles(user: Annotated[any, Depends(authenticated_user)]):
-        if user["role"] not in roles:
+    allowed = frozenset(roles)
+    def check_roles(claims: Annotated[dict, Depends(authenticated_claims)]):
+        if claims["role"] not in allowed:
             raise HTTPException(
                 status.HTTP_403_FORBIDDEN, "Access denied!"
             )
+        return claims
     return check_roles
 
-def has_permission(permission):
-    def check_permission(user: Annotated[any, Depends(authenticated_user)]):
-        role = user.get("role")
-        for entry in permissions:
-            if entry["role"] == role:
-                perms = entry.get("permissions", [])
-                if "*" in perms or permission in perms:
-                    return user
-                break
-        raise HTTPException(status.HTTP_403_FORBIDDEN, "Permission denied")
-    return check_permission
\ No newline at end of file
+def has_permission(permission, load_user=True):
+    """Authorize from token claims; load the user document only if the handler needs it."""
+    allowed = roles_with_permission(permission)
+    def check_claims(claims: Annotated[dict, Depends(authenticated_claims)]):
+        if claims["role"] not in allowed:
+            raise HTTPException(status.HTTP_403_FORBIDDEN, "Permission denied")
+        return claims
+    if not load_user:
+        return check_claims
+
+    def check_permission(
+        claims: Annotated[dict, Depends(check_claims)],
+        user: Annotated[dict, Depends(authenticated_user)],
+    ):
+        return user
+    return check_permission
@@ -0,0 +1,215 @@
+import logging
+import sys
+from datetime import datetime, timezone
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from db import async_bridgelms_db, bridgelms_db
+
+logger = logging.getLogger(__name__)
+
+# Every index the routers rely on, keyed by collection name
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+    ],
+    "courses": [
+        IndexModel([("tutor_id", ASCENDING)], name="tutor_id"),
+        IndexModel([("is_active", ASCENDING), ("_id", DESCENDING)], name="active_id"),
+        IndexModel(
+            [("is_active", ASCENDING), ("category_key", ASCENDING), ("_id", DESCENDING)],
+            name="active_category_id",
+        ),
+        IndexModel([("is_active", ASCENDING), ("search_terms", ASCENDING)], name="active_search_terms"),
+        IndexModel([("is_active", ASCENDING), ("search_fuzzy", ASCENDING)], name="active_search_fuzzy"),
+        # Keeps a resumed import from creating its in-flight batch twice
+        IndexModel(
+            [("import_row", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"import_row": {"$exists": True}},
+            name="import_row_unique",
+        ),
+    ],
+    "enrollments": [
+        IndexModel(
+            [("course_id", ASCENDING), ("learner_id", ASCENDING)],
+            unique=True,
+            name="course_learner_unique",
+        ),
+        IndexModel([("learner_id", ASCENDING), ("status", ASCENDING)], name="learner_status"),
+        IndexModel(
+            [("course_id", ASCENDING), ("status", ASCENDING), ("enrolled_at", ASCENDING)],
+            name="course_status_enrolled_at",
+        ),
+    ],
+    "attendance": [
+        IndexModel(
+            [("course_id", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)],
+            name="course_date_id",
+        ),
+        IndexModel(
+            [("learner_id", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)],
+            name="learner_date_id",
+        ),
+        IndexModel(
+            [("course_id", ASCENDING), ("learner_id", ASCENDING), ("day", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"day": {"$exists": True}},
+            name="course_learner_day_unique",
+        ),
+    ],
+    "announcements": [
+        IndexModel([("course_id", ASCENDING), ("created_at", DESCENDING)], name="course_created_at"),
+        IndexModel([("created_by", ASCENDING)], name="created_by"),
+    ],
+    "attendance_daily": [
+        IndexModel([("course_id", ASCENDING), ("day", DESCENDING)], unique=True, name="course_day_unique"),
+    ],
+    "attendance_learner_stats": [
+        IndexModel(
+            [("course_id", ASCENDING), ("learner_id", ASCENDING)],
+            unique=True,
+            name="course_learner_unique",
+        ),
+        IndexModel([("learner_id", ASCENDING)], name="learner_id"),
+    ],
+    "events": [
+        IndexModel(
+            [("course_id", ASCENDING), ("start", ASCENDING), ("series_end", ASCENDING)],
+            name="course_start_series_end",
+        ),
+        IndexModel([("start", ASCENDING), ("series_end", ASCENDING)], name="start_series_end"),
+    ],
+    "reminders": [
+        IndexModel([("status", ASCENDING), ("bucket", ASCENDING), ("remind_at", ASCENDING)], name="status_bucket"),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease_until"),
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING), ("remind_at", ASCENDING)], name="user_status_remind_at"),
+    ],
+    "inbox": [
+        IndexModel(
+            [("learner_id", ASCENDING), ("is_important", DESCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="learner_feed",
+        ),
+        IndexModel(
+            [("learner_id", ASCENDING), ("announcement_id", ASCENDING)],
+            unique=True,
+            name="learner_announcement_unique",
+        ),
+        IndexModel([("learner_id", ASCENDING), ("read", ASCENDING)], name="learner_read"),
+        IndexModel([("created_by", ASCENDING)], name="created_by"),
+    ],
+    "resources": [
+        IndexModel(
+            [("course_id", ASCENDING), ("uploaded_at", DESCENDING), ("_id", DESCENDING)],
+            name="course_uploaded_at_id",
+        ),
+        IndexModel([("content_hash", ASCENDING), ("status", ASCENDING)], name="content_hash_status"),
+    ],
+    "user_courses": [
+        # Materialized course lists are rebuilt from source a day after they were built
+        IndexModel([("refreshed_at", ASCENDING)], expireAfterSeconds=86400, name="refreshed_at_ttl"),
+        IndexModel([("courses.tutor_id", ASCENDING)], name="courses_tutor_id"),
+    ],
+    "jobs": [
+        IndexModel([("kind", ASCENDING), ("status", ASCENDING), ("lease_until", ASCENDING)], name="kind_status_lease_until"),
+    ],
+}
+
+# Representative shape of each query the routers issue: (collection, filter, sort)
+SAMPLE_DATE = datetime(2026, 1, 1, tzinfo=timezone.utc)
+QUERY_SHAPES = [
+    ("users", {"email": "learner@example.com"}, None),
+    ("courses", {"tutor_id": "0" * 24}, None),
+    ("courses", {"is_active": True}, [("_id", DESCENDING)]),
+    ("courses", {"is_active": True, "category_key": "science"}, [("_id", DESCENDING)]),
+    ("courses", {"is_active": True, "search_fuzzy": {"$all": ["algebra"]}}, None),
+    ("courses", {"is_active": True, "search_terms": {"$all": ["algebra"]}}, None),
+    ("courses", {"is_active": True, "$and": [{"$or": [
+        {"search_terms": {"$regex": "^algeb"}},
+        {"search_fuzzy": {"$in": ["algeb", "lgeb", "ageb", "aleb", "algb", "alge"]}},
+    ]}]}, None),
+    ("enrollments", {"course_id": "0" * 24, "learner_id": "0" * 24}, None),
+    ("enrollments", {"course_id": "0" * 24, "status": "waitlisted"}, [("enrolled_at", ASCENDING)]),
+    ("enrollments", {"learner_id": "0" * 24, "status": "active"}, None),
+    ("enrollments", {"course_id": "0" * 24, "learner_id": "0" * 24, "status": "active"}, None),
+    ("attendance", {"course_id": "0" * 24}, [("date", DESCENDING), ("_id", DESCENDING)]),
+    ("attendance", {"learner_id": "0" * 24}, [("date", DESCENDING), ("_id", DESCENDING)]),
+    ("attendance", {"course_id": {"$in": ["0" * 24]}}, [("date", DESCENDING), ("_id", DESCENDING)]),
+    ("attendance_daily", {"course_id": "0" * 24}, [("day", DESCENDING)]),
+    ("attendance_learner_stats", {"course_id": "0" * 24}, None),
+    ("attendance_learner_stats", {"learner_id": "0" * 24}, None),
+    ("events", {"course_id": {"$in": ["0" * 24]}, "start": {"$lt": SAMPLE_DATE}, "series_end": {"$gt": SAMPLE_DATE}}, None),
+    ("reminders", {"status": "pending", "bucket": {"$lte": SAMPLE_DATE}, "remind_at": {"$lte": SAMPLE_DATE}}, [("bucket", ASCENDING)]),
+    ("reminders", {"status": "leased", "lease_until": {"$lt": SAMPLE_DATE}}, None),
+    ("reminders", {"user_id": "0" * 24, "status": "pending"}, [("remind_at", ASCENDING)]),
+    ("inbox", {"learner_id": "0" * 24}, [("is_important", DESCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("inbox", {"learner_id": "0" * 24, "read": False}, None),
+    ("inbox", {"created_by": "0" * 24, "created_by_name": {"$ne": "Tutor"}}, None),
+    ("announcements", {"course_id": "0" * 24}, [("created_at", DESCENDING)]),
+    ("announcements", {"created_by": "0" * 24, "created_by_name": {"$ne": "Tutor"}}, None),
+    ("resources", {"course_id": "0" * 24}, [("uploaded_at", DESCENDING), ("_id", DESCENDING)]),
+    ("user_courses", {"_id": "0" * 24}, None),
+    ("user_courses", {"courses": {"$elemMatch": {"tutor_id": "0" * 24, "tutor_name": {"$ne": "Tutor"}}}}, None),
+    ("jobs", {"kind": "propagate_username", "$or": [
+        {"status": "queued"}, {"status": "running", "lease_until": {"$lt": SAMPLE_DATE}},
+    ]}, [("_id", ASCENDING)]),
+    ("jobs", {"kind": {"$in": ["import_courses", "import_users"]}, "$or": [
+        {"status": "queued"}, {"status": "running", "lease_until": {"$lt": SAMPLE_DATE}},
+    ]}, [("_id", ASCENDING)]),
+]
+
+async def ensure_indexes():
+    """Create all registered indexes. Safe to run on every startup.
+
+    Raises if a unique index cannot be built, usually because existing
+    documents already violate it.
+    """
+    for collection_name, models in INDEXES.items():
+        collection = async_bridgelms_db[collection_name]
+        try:
+            await collection.create_indexes(models)
+        except OperationFailure:
+            # Retry one by one so a single bad index doesn't block the others
+            for model in models:
+                try:
+                    await collection.create_indexes([model])
+                except OperationFailure as e:
+                    # Duplicate checks rely on unique indexes alone, so refuse to run without one
+                    if model.document.get("unique"):
+                        raise RuntimeError(
+                            f"Could not create unique index {model.document['name']} on {collection_name}; "
+                            f"remove the duplicates it reports and restart: {e}"
+                        ) from e
+                    logger.error("Could not create index %s on %s: %s", model.document["name"], collection_name, e)
+
+def _has_collscan(plan) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collscan(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(item) for item in plan)
+    return False
+
+def verify_query_plans() -> list:
+    """Explain every registered query shape and return the ones that scan a collection."""
+    offenders = []
+    for collection_name, query_filter, sort in QUERY_SHAPES:
+        cursor = bridgelms_db[collection_name].find(query_filter)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain().get("queryPlanner", {})
+        if _has_collscan(plan.get("winningPlan")):
+            offenders.append((collection_name, query_filter, sort))
+    return offenders
+
+if __name__ == "__main__":
+    # Usage: python indexes.py [--verify]
+    import asyncio
+    asyncio.run(ensure_indexes())
+    if "--verify" in sys.argv:
+        offenders = verify_query_plans()
+        for collection_name, query_filter, sort in offenders:
+            print(f"COLLSCAN on {collection_name}: filter={query_filter} sort={sort}")
+        if offenders:
+            sys.exit(1)
+        print(f"All {len(QUERY_SHAPES)} query shapes use an index")
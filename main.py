@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from route.users import users_router
@@ -6,6 +7,18 @@ from route.resources import resources_router
 from route.calendar import calendar_router
 from route.attendance import attendance_router
 from route.announcements import announcements_router
+from route.imports import imports_router
+from route.stream import stream_router
+from route.metrics import metrics_router
+from db import mongo_client, async_mongo_client
+from indexes import ensure_indexes
+from services import derivatives, passwords
+from services.metrics import TimingMiddleware
+from services.uploads import RequestSizeLimitMiddleware
+from services.pubsub import PUSH_SOURCE, relay
+from services.imports import import_worker
+from services.propagation import propagator
+from services.reminders import dispatcher
 import os
 from dotenv import load_dotenv
 
@@ -36,15 +49,52 @@ tags_metadata = [
         "name": "Announcements",
         "description": "Course updates and notifications",
     },
+    {
+        "name": "Bulk Import",
+        "description": "CSV and NDJSON imports of courses, users and enrollments",
+    },
+    {
+        "name": "Live Updates",
+        "description": "Server-sent events for announcements and check-ins",
+    },
+    {
+        "name": "Monitoring",
+        "description": "Metrics and on-demand profiling",
+    },
 ]
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ensure_indexes()
+    if os.getenv("REMINDER_DISPATCHER", "on") != "off":
+        dispatcher.start()
+    if os.getenv("PROPAGATION_WORKER", "on") != "off":
+        propagator.start()
+    if os.getenv("IMPORT_WORKER", "on") != "off":
+        import_worker.start()
+    if PUSH_SOURCE == "changestream":
+        relay.start()
+    yield
+    await relay.stop()
+    await dispatcher.stop()
+    await propagator.stop()
+    await import_worker.stop()
+    passwords.shutdown()
+    derivatives.shutdown()
+    await async_mongo_client.close()
+    mongo_client.close()
+
 app = FastAPI(
     title="BridgeLMS API",
     description="A lightweight Learning Management System connecting learners and tutors",
     version="1.0.0",
-    openapi_tags=tags_metadata
+    openapi_tags=tags_metadata,
+    lifespan=lifespan
 )
 
+# Oversized uploads are refused before Starlette spools them to disk
+app.add_middleware(RequestSizeLimitMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -52,8 +102,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Request timing, Mongo attribution and slow request logs
+app.add_middleware(TimingMiddleware)
+
 # Homepage
 @app.get("/")
 def get_home():
@@ -65,4 +119,7 @@ app.include_router(courses_router)
 app.include_router(resources_router)
 app.include_router(calendar_router)
 app.include_router(attendance_router)
-app.include_router(announcements_router)
\ No newline at end of file
+app.include_router(announcements_router)
+app.include_router(imports_router)
+app.include_router(stream_router)
+app.include_router(metrics_router)
\ No newline at end of file
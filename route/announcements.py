@@ -1,25 +1,62 @@
-from fastapi import APIRouter, Form, HTTPException, status, Depends
+from fastapi import APIRouter, BackgroundTasks, Form, HTTPException, status, Depends
 from typing import Annotated
-from db import announcements_collection, courses_collection
+from db import (
+    async_announcements_collection,
+    async_courses_collection,
+    async_feed_counters_collection,
+    async_inbox_collection,
+)
 from bson.objectid import ObjectId
+from utils import MongoModel, Page, page_size, keyset_filter, keyset_sort, next_cursor
 from dependencies.authn import authenticated_user
-from dependencies.authz import has_roles
+from dependencies.authz import has_roles, has_permission
+from services.feed import fan_out_announcement
+from services.pubsub import publish_announcement
 from datetime import datetime, timezone
 
+
+class FeedEntry(MongoModel):
+    announcement_id: str
+    title: str
+    content: str
+    course_id: str
+    created_by_name: str
+    is_important: bool
+    created_at: datetime
+    read: bool
+
+
+class FeedPage(Page[FeedEntry]):
+    unread_count: int
+
 announcements_router = APIRouter(tags=["Announcements"])
 
+# Important announcements are pinned above everything else
+FEED_PAGE_FIELDS = ["is_important", "created_at", "_id"]
+FEED_PROJECTION = {
+    "announcement_id": 1,
+    "title": 1,
+    "content": 1,
+    "course_id": 1,
+    "created_by_name": 1,
+    "is_important": 1,
+    "created_at": 1,
+    "read": 1,
+}
+
 @announcements_router.post("/announcements", dependencies=[Depends(has_roles(["admin", "tutor"]))])
-def create_announcement(
+async def create_announcement(
     title: Annotated[str, Form()],
     content: Annotated[str, Form()],
     course_id: Annotated[str, Form()],
     user: Annotated[dict, Depends(authenticated_user)],
+    background_tasks: BackgroundTasks,
     is_important: Annotated[bool, Form()] = False
 ):
     if not ObjectId.is_valid(course_id):
         raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Invalid course ID")
     
-    course = courses_collection.find_one({"_id": ObjectId(course_id), "is_active": True})
+    course = await async_courses_collection.find_one({"_id": ObjectId(course_id), "is_active": True})
     if not course:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Course not found")
     
@@ -33,5 +70,54 @@ def create_announcement(
         "created_at": datetime.now(tz=timezone.utc)
     }
     
-    result = announcements_collection.insert_one(announcement_data)
-    return {"message": "Announcement created successfully!", "announcement_id": str(result.inserted_id)}
\ No newline at end of file
+    result = await async_announcements_collection.insert_one(announcement_data)
+    background_tasks.add_task(fan_out_announcement, announcement_data)
+    publish_announcement(announcement_data)
+    return {"message": "Announcement created successfully!", "announcement_id": str(result.inserted_id)}
+
+@announcements_router.get("/announcements/feed", response_model=FeedPage)
+async def get_feed(
+    user: Annotated[dict, Depends(has_permission("view_announcements", load_user=False))],
+    limit: int = 20,
+    cursor: str | None = None
+):
+    limit = page_size(limit)
+    entries = await async_inbox_collection.find(
+        filter=keyset_filter({"learner_id": user["id"]}, FEED_PAGE_FIELDS, cursor),
+        projection=FEED_PROJECTION,
+        sort=keyset_sort(FEED_PAGE_FIELDS),
+        limit=limit + 1,
+    ).to_list()
+    cursor = next_cursor(entries, limit, FEED_PAGE_FIELDS)
+    counter = await async_feed_counters_collection.find_one({"_id": user["id"]})
+    return {
+        "data": entries,
+        "next_cursor": cursor,
+        "unread_count": max(counter["unread"], 0) if counter else 0
+    }
+
+@announcements_router.get("/announcements/unread-count")
+async def get_unread_count(user: Annotated[dict, Depends(has_permission("view_announcements", load_user=False))]):
+    counter = await async_feed_counters_collection.find_one({"_id": user["id"]})
+    return {"unread_count": max(counter["unread"], 0) if counter else 0}
+
+@announcements_router.post("/announcements/read-all")
+async def mark_all_read(user: Annotated[dict, Depends(has_permission("view_announcements", load_user=False))]):
+    await async_inbox_collection.update_many(
+        {"learner_id": user["id"], "read": False}, {"$set": {"read": True}}
+    )
+    await async_feed_counters_collection.update_one({"_id": user["id"]}, {"$set": {"unread": 0}})
+    return {"message": "All announcements marked as read"}
+
+@announcements_router.post("/announcements/{announcement_id}/read")
+async def mark_read(
+    announcement_id: str,
+    user: Annotated[dict, Depends(has_permission("view_announcements", load_user=False))]
+):
+    result = await async_inbox_collection.update_one(
+        {"learner_id": user["id"], "announcement_id": announcement_id, "read": False},
+        {"$set": {"read": True}}
+    )
+    if result.modified_count:
+        await async_feed_counters_collection.update_one({"_id": user["id"]}, {"$inc": {"unread": -1}})
+    return {"message": "Announcement marked as read"}
@@ -1,16 +1,80 @@
 from fastapi import APIRouter, HTTPException, status, Depends
-from typing import Annotated
-from db import attendance_collection, courses_collection, enrollments_collection
+from typing import Annotated, Literal
+from pydantic import BaseModel, Field
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from db import (
+    async_attendance_collection,
+    async_courses_collection,
+    async_enrollments_collection,
+    async_attendance_course_stats_collection,
+    async_attendance_daily_collection,
+    async_attendance_learner_stats_collection,
+)
 from bson.objectid import ObjectId
-from utils import replace_mongo_id
-from dependencies.authn import is_authenticated, authenticated_user
+from utils import (
+    MongoModel,
+    Page,
+    page_size,
+    keyset_filter,
+    keyset_sort,
+    next_cursor,
+    export_response,
+    EXPORT_BATCH_SIZE,
+)
+from dependencies.authn import is_authenticated, authenticated_claims, authenticated_user
 from dependencies.authz import has_roles
+from services.attendance_stats import attendance_day, attendance_rate, current_streak, record_checkins
+from services.enrollments import is_enrolled
+from services.pubsub import publish_checkins
+from services.user_courses import user_courses
 from datetime import datetime, timezone
 
+
+class BulkCheckinRequest(BaseModel):
+    learner_ids: list[str] = Field(min_length=1, max_length=1000)
+
+
+class AttendanceRecord(MongoModel):
+    course_id: str
+    learner_id: str
+    learner_name: str
+    date: datetime
+    status: str
+
 attendance_router = APIRouter(tags=["Attendance"])
 
+ATTENDANCE_PROJECTION = {
+    "course_id": 1,
+    "learner_id": 1,
+    "learner_name": 1,
+    "date": 1,
+    "status": 1,
+}
+ATTENDANCE_PAGE_FIELDS = ["date", "_id"]
+ATTENDANCE_EXPORT_FIELDS = ["id", "course_id", "learner_id", "learner_name", "date", "status"]
+
+async def find_attendance_page(query_filter: dict, limit: int, cursor: str | None):
+    limit = page_size(limit)
+    records = await async_attendance_collection.find(
+        filter=keyset_filter(query_filter, ATTENDANCE_PAGE_FIELDS, cursor),
+        projection=ATTENDANCE_PROJECTION,
+        sort=keyset_sort(ATTENDANCE_PAGE_FIELDS),
+        limit=limit + 1,
+    ).to_list()
+    cursor = next_cursor(records, limit, ATTENDANCE_PAGE_FIELDS)
+    return {"data": records, "next_cursor": cursor}
+
+def export_attendance(query_filter: dict, export_format: str, filename: str):
+    cursor = async_attendance_collection.find(
+        filter=query_filter,
+        projection=ATTENDANCE_PROJECTION,
+        sort=keyset_sort(ATTENDANCE_PAGE_FIELDS),
+        batch_size=EXPORT_BATCH_SIZE,
+    )
+    return export_response(cursor, ATTENDANCE_EXPORT_FIELDS, export_format, filename)
+
 @attendance_router.post("/attendance/checkin/{course_id}", dependencies=[Depends(has_roles(["learner"]))])
-def checkin_attendance(
+async def checkin_attendance(
     course_id: str,
     user: Annotated[dict, Depends(authenticated_user)]
 ):
@@ -18,64 +82,201 @@ def checkin_attendance(
         raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Invalid course ID")
     
     # Verify enrollment
-    enrollment = enrollments_collection.find_one({
-        "course_id": course_id,
-        "learner_id": user["id"],
-        "status": "active"
-    })
-    
-    if not enrollment:
+    if not await is_enrolled(user["id"], course_id):
         raise HTTPException(status.HTTP_403_FORBIDDEN, "Not enrolled in this course")
     
-    # Check if already checked in today
-    today = datetime.now(tz=timezone.utc).date()
-    existing_checkin = attendance_collection.find_one({
-        "course_id": course_id,
-        "learner_id": user["id"],
-        "date": {"$gte": datetime.combine(today, datetime.min.time().replace(tzinfo=timezone.utc))}
-    })
-    
-    if existing_checkin:
-        raise HTTPException(status.HTTP_409_CONFLICT, "Already checked in today")
-    
+    now = datetime.now(tz=timezone.utc)
     attendance_data = {
         "course_id": course_id,
         "learner_id": user["id"],
         "learner_name": user["username"],
-        "date": datetime.now(tz=timezone.utc),
+        "date": now,
+        "day": attendance_day(now),
         "status": "present"
     }
     
-    result = attendance_collection.insert_one(attendance_data)
+    # The unique (course_id, learner_id, day) index rejects a second check-in
+    try:
+        result = await async_attendance_collection.insert_one(attendance_data)
+    except DuplicateKeyError:
+        raise HTTPException(status.HTTP_409_CONFLICT, "Already checked in today")
+    await record_checkins(course_id, [user["id"]], attendance_data["day"])
+    publish_checkins([attendance_data])
     return {"message": "Attendance recorded successfully!", "attendance_id": str(result.inserted_id)}
 
-@attendance_router.get("/attendance/course/{course_id}", dependencies=[Depends(has_roles(["admin", "tutor"]))])
-def get_course_attendance(
+@attendance_router.post("/attendance/checkin/{course_id}/bulk", dependencies=[Depends(has_roles(["admin", "tutor"]))])
+async def bulk_checkin_attendance(
     course_id: str,
-    user: Annotated[dict, Depends(authenticated_user)]
+    request: BulkCheckinRequest,
+    user: Annotated[dict, Depends(authenticated_claims)]
+):
+    if not ObjectId.is_valid(course_id):
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Invalid course ID")
+    
+    course = await async_courses_collection.find_one({"_id": ObjectId(course_id)}, {"tutor_id": 1})
+    if not course:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Course not found")
+    
+    if user["role"] == "tutor" and course["tutor_id"] != user["id"]:
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Access denied to this course")
+    
+    learner_ids = list(dict.fromkeys(request.learner_ids))
+    enrollments = await async_enrollments_collection.find(
+        {"course_id": course_id, "learner_id": {"$in": learner_ids}, "status": "active"},
+        {"_id": 0, "learner_id": 1, "learner_name": 1},
+    ).to_list()
+    
+    now = datetime.now(tz=timezone.utc)
+    day = attendance_day(now)
+    attendance_data = [
+        {
+            "course_id": course_id,
+            "learner_id": enrollment["learner_id"],
+            "learner_name": enrollment["learner_name"],
+            "date": now,
+            "day": day,
+            "status": "present"
+        }
+        for enrollment in enrollments
+    ]
+    
+    already_checked_in = []
+    if attendance_data:
+        try:
+            await async_attendance_collection.insert_many(attendance_data, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details["writeErrors"]:
+                if error["code"] != 11000:
+                    raise
+                already_checked_in.append(error["op"]["learner_id"])
+    
+    enrolled = {enrollment["learner_id"] for enrollment in enrollments}
+    recorded = list(enrolled.difference(already_checked_in))
+    await record_checkins(course_id, recorded, day)
+    duplicates = set(already_checked_in)
+    publish_checkins([attendance for attendance in attendance_data if attendance["learner_id"] not in duplicates])
+    return {
+        "message": "Attendance recorded successfully!",
+        "recorded": len(recorded),
+        "already_checked_in": already_checked_in,
+        "not_enrolled": [learner_id for learner_id in learner_ids if learner_id not in enrolled],
+    }
+
+@attendance_router.get(
+    "/attendance/course/{course_id}",
+    response_model=Page[AttendanceRecord],
+    dependencies=[Depends(has_roles(["admin", "tutor"]))],
+)
+async def get_course_attendance(
+    course_id: str,
+    user: Annotated[dict, Depends(authenticated_claims)],
+    limit: int = 50,
+    cursor: str | None = None,
+    format: Literal["json", "ndjson", "csv"] = "json"
 ):
     if not ObjectId.is_valid(course_id):
         raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Invalid course ID")
     
     # Verify tutor access
-    course = courses_collection.find_one({"_id": ObjectId(course_id)})
+    course = await async_courses_collection.find_one({"_id": ObjectId(course_id)})
     if not course:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Course not found")
     
     if user["role"] == "tutor" and course["tutor_id"] != user["id"]:
         raise HTTPException(status.HTTP_403_FORBIDDEN, "Access denied to this course")
     
-    attendance_records = list(attendance_collection.find({"course_id": course_id}).sort("date", -1))
-    return {"data": list(map(replace_mongo_id, attendance_records))}
+    if format != "json":
+        return export_attendance({"course_id": course_id}, format, f"attendance-{course_id}")
+    return await find_attendance_page({"course_id": course_id}, limit, cursor)
 
-@attendance_router.get("/attendance/my-attendance", dependencies=[Depends(is_authenticated)])
-def get_my_attendance(user: Annotated[dict, Depends(authenticated_user)]):
+@attendance_router.get(
+    "/attendance/my-attendance",
+    response_model=Page[AttendanceRecord],
+    dependencies=[Depends(is_authenticated)],
+)
+async def get_my_attendance(
+    user: Annotated[dict, Depends(authenticated_claims)],
+    limit: int = 50,
+    cursor: str | None = None,
+    format: Literal["json", "ndjson", "csv"] = "json"
+):
     if user["role"] == "learner":
-        attendance_records = list(attendance_collection.find({"learner_id": user["id"]}).sort("date", -1))
+        query_filter = {"learner_id": user["id"]}
     else:
         # For tutors, get attendance for all their courses
-        courses = list(courses_collection.find({"tutor_id": user["id"]}))
-        course_ids = [str(course["_id"]) for course in courses]
-        attendance_records = list(attendance_collection.find({"course_id": {"$in": course_ids}}).sort("date", -1))
+        course_ids = [course["id"] for course in await user_courses(user)]
+        query_filter = {"course_id": {"$in": course_ids}}
+    
+    if format != "json":
+        return export_attendance(query_filter, format, "my-attendance")
+    return await find_attendance_page(query_filter, limit, cursor)
+
+
+@attendance_router.get("/attendance/course/{course_id}/stats", dependencies=[Depends(has_roles(["admin", "tutor"]))])
+async def get_course_attendance_stats(
+    course_id: str,
+    user: Annotated[dict, Depends(authenticated_claims)],
+    days: int = 30
+):
+    if not ObjectId.is_valid(course_id):
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Invalid course ID")
+    
+    course = await async_courses_collection.find_one({"_id": ObjectId(course_id)}, {"tutor_id": 1})
+    if not course:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Course not found")
+    
+    if user["role"] == "tutor" and course["tutor_id"] != user["id"]:
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Access denied to this course")
+    
+    course_stats = await async_attendance_course_stats_collection.find_one({"_id": course_id}) or {}
+    daily_headcounts = await async_attendance_daily_collection.find(
+        {"course_id": course_id},
+        {"_id": 0, "day": 1, "count": 1},
+        sort=[("day", -1)],
+        limit=max(1, min(days, 366)),
+    ).to_list()
+    learner_stats = await async_attendance_learner_stats_collection.find({"course_id": course_id}).to_list()
+    
+    today = attendance_day(datetime.now(tz=timezone.utc))
+    sessions = course_stats.get("sessions", 0)
+    return {"data": {
+        "course_id": course_id,
+        "sessions": sessions,
+        "checkins": course_stats.get("checkins", 0),
+        "average_headcount": round(course_stats.get("checkins", 0) / sessions, 2) if sessions else 0.0,
+        "last_day": course_stats.get("last_day"),
+        "daily_headcounts": daily_headcounts,
+        "learners": [
+            {
+                "learner_id": stats["learner_id"],
+                "checkins": stats.get("checkins", 0),
+                "attendance_rate": attendance_rate(stats, course_stats),
+                "streak": current_streak(stats, course_stats, today),
+                "longest_streak": stats.get("longest_streak", 0),
+            }
+            for stats in learner_stats
+        ],
+    }}
+
+@attendance_router.get("/attendance/my-stats", dependencies=[Depends(has_roles(["learner"]))])
+async def get_my_attendance_stats(user: Annotated[dict, Depends(authenticated_claims)]):
+    learner_stats = await async_attendance_learner_stats_collection.find({"learner_id": user["id"]}).to_list()
+    course_stats = {
+        stats["_id"]: stats
+        for stats in await async_attendance_course_stats_collection.find(
+            {"_id": {"$in": [stats["course_id"] for stats in learner_stats]}}
+        ).to_list()
+    }
     
-    return {"data": list(map(replace_mongo_id, attendance_records))}
\ No newline at end of file
+    today = attendance_day(datetime.now(tz=timezone.utc))
+    return {"data": [
+        {
+            "course_id": stats["course_id"],
+            "sessions": course_stats.get(stats["course_id"], {}).get("sessions", 0),
+            "checkins": stats.get("checkins", 0),
+            "attendance_rate": attendance_rate(stats, course_stats.get(stats["course_id"], {})),
+            "streak": current_streak(stats, course_stats.get(stats["course_id"], {}), today),
+            "longest_streak": stats.get("longest_streak", 0),
+        }
+        for stats in learner_stats
+    ]}
@@ -1,7 +1,174 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Form, Header, HTTPException, Response, status
+from typing import Annotated
+from datetime import datetime, timedelta, timezone
+import hashlib
+from bson.objectid import ObjectId
+from utils import Listing, MongoModel
+from db import async_courses_collection, async_events_collection, async_reminders_collection
+from dependencies.authn import authenticated_claims
+from dependencies.authz import has_permission
+from services.enrollments import visible_course_ids
+from services.recurrence import as_utc, expand, parse_rrule, series_end
+from services.reminders import reminder_bucket
+
+
+class ReminderSummary(MongoModel):
+    event_id: str | None = None
+    message: str
+    remind_at: datetime
 
 calendar_router = APIRouter(tags=["Calendar & Events"])
 
+MAX_WINDOW = timedelta(days=366)
+DEFAULT_WINDOW = timedelta(days=30)
+
+@calendar_router.post("/calendar/events")
+async def create_event(
+    title: Annotated[str, Form()],
+    course_id: Annotated[str, Form()],
+    start: Annotated[datetime, Form()],
+    end: Annotated[datetime, Form()],
+    user: Annotated[dict, Depends(has_permission("create_events", load_user=False))],
+    description: Annotated[str, Form()] = "",
+    rrule: Annotated[str | None, Form()] = None
+):
+    if not ObjectId.is_valid(course_id):
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Invalid course ID")
+
+    course = await async_courses_collection.find_one({"_id": ObjectId(course_id)}, {"tutor_id": 1})
+    if not course:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Course not found")
+
+    if user["role"] == "tutor" and course["tutor_id"] != user["id"]:
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Access denied to this course")
+
+    start, end = as_utc(start), as_utc(end)
+    if end <= start:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Event must end after it starts")
+
+    try:
+        rule = parse_rrule(rrule, start) if rrule else None
+    except ValueError as e:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, f"Invalid recurrence rule: {e}")
+
+    now = datetime.now(tz=timezone.utc)
+    event_data = {
+        "title": title,
+        "description": description,
+        "course_id": course_id,
+        "start": start,
+        "end": end,
+        "rrule": rrule.upper() if rrule else None,
+        # Only the series bounds are stored; occurrences are expanded per request
+        "series_end": series_end(start, end, rule),
+        "created_by": user["id"],
+        "created_at": now,
+        "updated_at": now
+    }
+
+    result = await async_events_collection.insert_one(event_data)
+    return {"message": "Event created successfully!", "event_id": str(result.inserted_id)}
+
 @calendar_router.get("/calendar/events")
-def get_events():
-    return {"data": [], "message": "Calendar functionality coming soon"}
\ No newline at end of file
+async def get_events(
+    user: Annotated[dict, Depends(authenticated_claims)],
+    response: Response,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    if_none_match: Annotated[str | None, Header()] = None
+):
+    # The default window starts at midnight so polling clients keep a stable ETag
+    today = datetime.now(tz=timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    window_start = as_utc(start) if start else today
+    window_end = as_utc(end) if end else window_start + DEFAULT_WINDOW
+    if window_end <= window_start or window_end - window_start > MAX_WINDOW:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Window must be positive and at most 366 days")
+
+    # Series that start before the window ends and finish after it starts
+    query_filter = {"start": {"$lt": window_end}, "series_end": {"$gt": window_start}}
+    course_ids = await visible_course_ids(user)
+    if course_ids is not None:
+        query_filter["course_id"] = {"$in": sorted(course_ids)}
+
+    events = await async_events_collection.find(query_filter).sort("_id", 1).to_list()
+
+    # Events only change through updated_at, so the version of the window is cheap to compute
+    version = hashlib.sha1(f"{window_start.isoformat()}|{window_end.isoformat()}".encode("utf-8"))
+    for event in events:
+        version.update(f"|{event['_id']}:{event['updated_at'].isoformat()}".encode("utf-8"))
+    etag = f'"{version.hexdigest()}"'
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+
+    occurrences = []
+    for event in events:
+        rule = parse_rrule(event["rrule"], as_utc(event["start"])) if event.get("rrule") else None
+        for occurrence_start, occurrence_end in expand(event["start"], event["end"], rule, window_start, window_end):
+            occurrences.append({
+                "event_id": str(event["_id"]),
+                "title": event["title"],
+                "description": event.get("description", ""),
+                "course_id": event["course_id"],
+                "start": occurrence_start,
+                "end": occurrence_end,
+                "recurring": rule is not None
+            })
+    occurrences.sort(key=lambda occurrence: occurrence["start"])
+    return {"data": occurrences}
+
+@calendar_router.delete("/calendar/events/{event_id}")
+async def delete_event(
+    event_id: str,
+    user: Annotated[dict, Depends(has_permission("create_events", load_user=False))]
+):
+    if not ObjectId.is_valid(event_id):
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Invalid event ID")
+
+    event_filter = {"_id": ObjectId(event_id)}
+    if user["role"] != "admin":
+        event_filter["created_by"] = user["id"]
+
+    result = await async_events_collection.delete_one(event_filter)
+    if not result.deleted_count:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Event not found")
+    return {"message": "Event deleted successfully!"}
+
+@calendar_router.post("/calendar/reminders")
+async def set_reminder(
+    message: Annotated[str, Form()],
+    remind_at: Annotated[datetime, Form()],
+    user: Annotated[dict, Depends(has_permission("set_reminders", load_user=False))],
+    event_id: Annotated[str | None, Form()] = None
+):
+    if event_id is not None and not ObjectId.is_valid(event_id):
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Invalid event ID")
+
+    remind_at = as_utc(remind_at)
+    if remind_at <= datetime.now(tz=timezone.utc):
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Reminder time must be in the future")
+
+    reminder_data = {
+        "user_id": user["id"],
+        "event_id": event_id,
+        "message": message,
+        "remind_at": remind_at,
+        "bucket": reminder_bucket(remind_at),
+        "status": "pending",
+        "attempts": 0,
+        "created_at": datetime.now(tz=timezone.utc)
+    }
+
+    result = await async_reminders_collection.insert_one(reminder_data)
+    return {"message": "Reminder set successfully!", "reminder_id": str(result.inserted_id)}
+
+@calendar_router.get("/calendar/reminders", response_model=Listing[ReminderSummary])
+async def get_reminders(user: Annotated[dict, Depends(has_permission("set_reminders", load_user=False))]):
+    reminders = await async_reminders_collection.find(
+        {"user_id": user["id"], "status": "pending"},
+        {"_id": 1, "event_id": 1, "message": 1, "remind_at": 1},
+        sort=[("remind_at", 1)],
+        limit=100,
+    ).to_list()
+    return {"data": reminders}
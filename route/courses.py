@@ -1,16 +1,72 @@
-from fastapi import APIRouter, Form, HTTPException, status, Depends
+from fastapi import APIRouter, BackgroundTasks, Form, Header, HTTPException, status, Depends
 from typing import Annotated, List
-from db import courses_collection, enrollments_collection, users_collection
+from db import async_courses_collection, async_enrollments_collection
 from bson.objectid import ObjectId
-from utils import replace_mongo_id
-from dependencies.authn import is_authenticated, authenticated_user
+from pymongo.errors import DuplicateKeyError
+from pydantic import BaseModel
+from utils import (
+    Listing,
+    MongoModel,
+    Page,
+    page_size,
+    encode_cursor,
+    decode_cursor,
+    keyset_filter,
+    keyset_sort,
+    next_cursor,
+)
+from services.cache import cached_response, invalidate
+from services.enrollments import invalidate_learner_courses, invalidate_taught_courses
+from services.feed import backfill_inbox
+from services.user_courses import COURSE_SUMMARY_PROJECTION, add_user_course, remove_user_course, user_courses
+from services.search import (
+    CANDIDATE_LIMIT,
+    normalize_category,
+    query_tokens,
+    relevance,
+    search_fields,
+    search_tiers,
+)
+from dependencies.authn import is_authenticated, authenticated_claims, authenticated_user
 from dependencies.authz import has_roles, has_permission
 from datetime import datetime, timezone
 
+
+class CourseSummary(MongoModel):
+    title: str
+    description: str
+    category: str
+    max_students: int
+    is_public: bool
+    tutor_id: str
+    tutor_name: str
+    created_at: datetime
+    is_active: bool
+
+
+class TutorDetails(BaseModel):
+    tutor_name: str
+    tutor_email: str
+    tutor_phone: str
+    tutor_bio: str
+
 courses_router = APIRouter(tags=["Courses"])
 
+COURSE_PROJECTION = {
+    "title": 1,
+    "description": 1,
+    "category": 1,
+    "max_students": 1,
+    "is_public": 1,
+    "tutor_id": 1,
+    "tutor_name": 1,
+    "created_at": 1,
+    "is_active": 1,
+}
+COURSE_PAGE_FIELDS = ["_id"]
+
 @courses_router.post("/courses", dependencies=[Depends(has_roles(["admin", "tutor"]))])
-def create_course(
+async def create_course(
     user: Annotated[dict, Depends(authenticated_user)],
     title: Annotated[str, Form()],
     description: Annotated[str, Form()],
@@ -23,103 +79,224 @@ def create_course(
         "description": description,
         "category": category,
         "max_students": max_students,
+        "enrolled_count": 0,
         "is_public": is_public,
         "tutor_id": user["id"],
         "tutor_name": user["username"],
         "created_at": datetime.now(tz=timezone.utc),
-        "is_active": True
+        "is_active": True,
+        **search_fields(title, description, category)
     }
     
-    result = courses_collection.insert_one(course_data)
+    result = await async_courses_collection.insert_one(course_data)
+    invalidate_taught_courses(user["id"])
+    await add_user_course(user["id"], course_data)
+    await invalidate("courses")
     return {"message": "Course created successfully!", "course_id": str(result.inserted_id)}
 
-@courses_router.get("/courses")
-def get_courses(
+async def find_courses(query_filter: dict, tokens: list, limit: int, cursor: str | None) -> Page[CourseSummary]:
+    if not tokens:
+        courses = await async_courses_collection.find(
+            filter=keyset_filter(query_filter, COURSE_PAGE_FIELDS, cursor),
+            projection=COURSE_PROJECTION,
+            sort=keyset_sort(COURSE_PAGE_FIELDS),
+            limit=limit + 1,
+        ).to_list()
+        cursor = next_cursor(courses, limit, COURSE_PAGE_FIELDS)
+        return Page[CourseSummary](data=courses, next_cursor=cursor)
+    
+    # Ranked results are paged by offset into the bounded candidate set
+    offset = decode_cursor(cursor, 1)[0] if cursor else 0
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid cursor")
+    
+    candidates = []
+    for tier in search_tiers(tokens):
+        if len(candidates) >= CANDIDATE_LIMIT:
+            break
+        tier_filter = {**query_filter, **tier}
+        if candidates:
+            tier_filter["_id"] = {"$nin": [course["_id"] for course in candidates]}
+        candidates += await async_courses_collection.find(
+            filter=tier_filter, projection=COURSE_PROJECTION, limit=CANDIDATE_LIMIT - len(candidates)
+        ).to_list()
+    candidates.sort(key=lambda course: relevance(course, tokens), reverse=True)
+    courses = candidates[offset:offset + limit]
+    cursor = encode_cursor([offset + limit]) if offset + limit < len(candidates) else None
+    return Page[CourseSummary](data=courses, next_cursor=cursor)
+
+@courses_router.get("/courses", response_model=Page[CourseSummary])
+async def get_courses(
     category: str | None = None,
     search: str | None = None,
     limit: int = 20,
-    skip: int = 0
+    cursor: str | None = None,
+    if_none_match: Annotated[str | None, Header()] = None
 ):
+    limit = page_size(limit)
     query_filter = {"is_active": True}
     
     if category:
-        query_filter["category"] = {"$regex": f"^{category}$", "$options": "i"}
+        query_filter["category_key"] = normalize_category(category)
     
-    if search:
-        query_filter["$or"] = [
-            {"title": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}}
-        ]
-    
-    courses = list(courses_collection.find(filter=query_filter, limit=limit, skip=skip))
-    return {"data": list(map(replace_mongo_id, courses))}
+    tokens = query_tokens(search) if search else []
+    # Equivalent spellings of a query share one cache entry
+    params = {"category": query_filter.get("category_key"), "tokens": tokens, "limit": limit, "cursor": cursor}
+    return await cached_response(
+        "courses", params, lambda: find_courses(query_filter, tokens, limit, cursor), if_none_match
+    )
+
+async def activated(enrollment: dict, course: dict | None, background_tasks: BackgroundTasks):
+    """Refresh what a learner sees after they take a seat."""
+    invalidate_learner_courses(enrollment["learner_id"])
+    background_tasks.add_task(backfill_inbox, enrollment["course_id"], [enrollment["learner_id"]])
+    if course:
+        await add_user_course(enrollment["learner_id"], course)
+
+async def promote_waitlisted(course_id: str, background_tasks: BackgroundTasks) -> dict | None:
+    """Give a free seat, if there is one, to the longest-waiting learner.
+
+    The seat is reserved with the same conditional increment as an
+    enrollment, so a promotion never overbooks. Returns the promoted
+    enrollment.
+    """
+    while waiting := await async_enrollments_collection.find_one(
+        {"course_id": course_id, "status": "waitlisted"}, {"_id": 1}, sort=[("enrolled_at", 1)]
+    ):
+        course = await async_courses_collection.find_one_and_update(
+            {"_id": ObjectId(course_id), "$expr": {"$lt": [{"$ifNull": ["$enrolled_count", 0]}, "$max_students"]}},
+            {"$inc": {"enrolled_count": 1}},
+            projection=COURSE_SUMMARY_PROJECTION,
+        )
+        if not course:
+            return None
+        promoted = await async_enrollments_collection.find_one_and_update(
+            {"_id": waiting["_id"], "status": "waitlisted"},
+            {"$set": {"status": "active", "enrolled_at": datetime.now(tz=timezone.utc)}},
+        )
+        if promoted:
+            await activated(promoted, course, background_tasks)
+            return promoted
+        # They left or were promoted meanwhile; hand the seat back and look again
+        await async_courses_collection.update_one({"_id": course["_id"]}, {"$inc": {"enrolled_count": -1}})
+    return None
 
 @courses_router.post("/courses/{course_id}/enroll", dependencies=[Depends(has_roles(["learner"]))])
-def enroll_course(
+async def enroll_course(
     course_id: str,
-    user: Annotated[dict, Depends(authenticated_user)]
+    user: Annotated[dict, Depends(authenticated_user)],
+    background_tasks: BackgroundTasks
 ):
     if not ObjectId.is_valid(course_id):
         raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Invalid course ID")
     
-    course = courses_collection.find_one({"_id": ObjectId(course_id), "is_active": True})
-    if not course:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, "Course not found")
-    
-    # Check if already enrolled
-    existing_enrollment = enrollments_collection.find_one({
-        "course_id": course_id,
-        "learner_id": user["id"]
-    })
+    # Reserve a seat with a single conditional increment
+    course = await async_courses_collection.find_one_and_update(
+        {
+            "_id": ObjectId(course_id),
+            "is_active": True,
+            "$expr": {"$lt": [{"$ifNull": ["$enrolled_count", 0]}, "$max_students"]},
+        },
+        {"$inc": {"enrolled_count": 1}},
+        projection=COURSE_SUMMARY_PROJECTION,
+    )
     
-    if existing_enrollment:
-        raise HTTPException(status.HTTP_409_CONFLICT, "Already enrolled in this course")
-    
-    # Check course capacity
-    current_enrollments = enrollments_collection.count_documents({"course_id": course_id})
-    if current_enrollments >= course["max_students"]:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Course is full")
+    if not course and not await async_courses_collection.find_one(
+        {"_id": ObjectId(course_id), "is_active": True}, {"_id": 1}
+    ):
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Course not found")
     
     enrollment_data = {
         "course_id": course_id,
         "learner_id": user["id"],
         "learner_name": user["username"],
         "enrolled_at": datetime.now(tz=timezone.utc),
-        "status": "active"
+        "status": "active" if course else "waitlisted"
     }
     
-    enrollments_collection.insert_one(enrollment_data)
-    return {"message": "Successfully enrolled in course!"}
-
-@courses_router.get("/courses/my-courses", dependencies=[Depends(is_authenticated)])
-def get_my_courses(user: Annotated[dict, Depends(authenticated_user)]):
-    if user["role"] in ["admin", "tutor"]:
-        # Get courses taught by the user
-        courses = list(courses_collection.find({"tutor_id": user["id"]}))
-    else:
-        # Get courses enrolled by the learner
-        enrollments = list(enrollments_collection.find({"learner_id": user["id"]}))
-        course_ids = [enrollment["course_id"] for enrollment in enrollments]
-        courses = list(courses_collection.find({"_id": {"$in": [ObjectId(cid) for cid in course_ids]}}))
+    # The unique (course_id, learner_id) index rejects double enrollment
+    try:
+        await async_enrollments_collection.insert_one(enrollment_data)
+    except DuplicateKeyError:
+        if course:
+            await async_courses_collection.update_one({"_id": course["_id"]}, {"$inc": {"enrolled_count": -1}})
+        raise HTTPException(status.HTTP_409_CONFLICT, "Already enrolled in this course")
     
-    return {"data": list(map(replace_mongo_id, courses))}
+    if not course:
+        # A seat freed since the reservation failed goes to the head of the waitlist
+        promoted = await promote_waitlisted(course_id, background_tasks)
+        if not promoted or promoted["learner_id"] != user["id"]:
+            return {"message": "Course is full, you have been added to the waitlist", "status": "waitlisted"}
+        return {"message": "Successfully enrolled in course!", "status": "active"}
+    await activated(enrollment_data, course, background_tasks)
+    return {"message": "Successfully enrolled in course!", "status": "active"}
 
-@courses_router.get("/courses/{course_id}/tutor")
-def get_course_tutor(course_id: str):
+@courses_router.delete("/courses/{course_id}/enroll", dependencies=[Depends(has_roles(["learner"]))])
+async def unenroll_course(
+    course_id: str,
+    user: Annotated[dict, Depends(authenticated_claims)],
+    background_tasks: BackgroundTasks
+):
     if not ObjectId.is_valid(course_id):
         raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Invalid course ID")
     
-    course = courses_collection.find_one({"_id": ObjectId(course_id)})
-    if not course:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, "Course not found")
+    enrollment = await async_enrollments_collection.find_one_and_delete({
+        "course_id": course_id,
+        "learner_id": user["id"]
+    })
+    if not enrollment:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Not enrolled in this course")
+    invalidate_learner_courses(user["id"])
+    await remove_user_course(user["id"], course_id)
+    
+    if enrollment["status"] == "active":
+        # Hand the seat to the longest-waiting learner, or release it
+        promoted = await async_enrollments_collection.find_one_and_update(
+            {"course_id": course_id, "status": "waitlisted"},
+            {"$set": {"status": "active", "enrolled_at": datetime.now(tz=timezone.utc)}},
+            sort=[("enrolled_at", 1)],
+        )
+        if promoted:
+            course = await async_courses_collection.find_one({"_id": ObjectId(course_id)}, COURSE_SUMMARY_PROJECTION)
+            await activated(promoted, course, background_tasks)
+        else:
+            await async_courses_collection.update_one(
+                {"_id": ObjectId(course_id)}, {"$inc": {"enrolled_count": -1}}
+            )
+            # Someone waitlisted after the lookup above would otherwise never get this seat
+            await promote_waitlisted(course_id, background_tasks)
     
-    tutor = users_collection.find_one({"_id": ObjectId(course["tutor_id"])})
-    if not tutor:
+    return {"message": "Successfully left the course!"}
+
+@courses_router.get("/courses/my-courses", response_model=Listing[CourseSummary], dependencies=[Depends(is_authenticated)])
+async def get_my_courses(user: Annotated[dict, Depends(authenticated_claims)]):
+    return {"data": await user_courses(user)}
+
+async def find_course_tutor(course_id: str) -> TutorDetails:
+    cursor = await async_courses_collection.aggregate([
+        {"$match": {"_id": ObjectId(course_id)}},
+        {"$project": {"_id": 0, "tutor_id": {"$toObjectId": "$tutor_id"}}},
+        {"$lookup": {"from": "users", "localField": "tutor_id", "foreignField": "_id", "as": "tutor"}},
+    ])
+    courses = await cursor.to_list(1)
+    if not courses:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Course not found")
+    if not courses[0]["tutor"]:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Tutor not found")
     
-    return {
-        "tutor_name": tutor["username"],
-        "tutor_email": tutor["email"],
-        "tutor_phone": tutor.get("phone", ""),
-        "tutor_bio": tutor.get("bio", "")
-    }
\ No newline at end of file
+    tutor = courses[0]["tutor"][0]
+    return TutorDetails(
+        tutor_name=tutor["username"],
+        tutor_email=tutor["email"],
+        tutor_phone=tutor.get("phone", ""),
+        tutor_bio=tutor.get("bio", "")
+    )
+
+@courses_router.get("/courses/{course_id}/tutor", response_model=TutorDetails)
+async def get_course_tutor(course_id: str, if_none_match: Annotated[str | None, Header()] = None):
+    if not ObjectId.is_valid(course_id):
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Invalid course ID")
+    
+    return await cached_response(
+        "tutors", {"course_id": course_id}, lambda: find_course_tutor(course_id), if_none_match
+    )
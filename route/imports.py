@@ -0,0 +1,87 @@
+from fastapi import APIRouter, UploadFile, File, HTTPException, status, Depends
+from typing import Annotated
+from bson.objectid import ObjectId
+from pydantic import BaseModel
+from utils import MongoModel
+from dependencies.authn import authenticated_claims, authenticated_user
+from dependencies.authz import has_roles
+from services.imports import queue_import
+from services.jobs import find_job
+from datetime import datetime
+
+
+class RowError(BaseModel):
+    row: int
+    error: str
+
+
+class ImportJob(MongoModel):
+    kind: str
+    status: str
+    processed: int
+    succeeded: int
+    failed: int
+    errors: list[RowError]
+    error: str | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+
+class ImportJobResponse(BaseModel):
+    data: ImportJob
+
+imports_router = APIRouter(tags=["Bulk Import"])
+
+async def start_import(kind: str, file: UploadFile, user: dict) -> dict:
+    job_id = await queue_import(kind, file, user)
+    return {"message": "Import queued", "job_id": job_id}
+
+@imports_router.post(
+    "/imports/courses",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(has_roles(["admin", "tutor"]))],
+)
+async def import_courses(
+    user: Annotated[dict, Depends(authenticated_user)],
+    file: UploadFile = File(...)
+):
+    return await start_import("import_courses", file, user)
+
+@imports_router.post(
+    "/imports/users",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(has_roles(["admin"]))],
+)
+async def import_users(
+    user: Annotated[dict, Depends(authenticated_claims)],
+    file: UploadFile = File(...)
+):
+    return await start_import("import_users", file, user)
+
+@imports_router.post(
+    "/imports/enrollments",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(has_roles(["admin"]))],
+)
+async def import_enrollments(
+    user: Annotated[dict, Depends(authenticated_claims)],
+    file: UploadFile = File(...)
+):
+    return await start_import("import_enrollments", file, user)
+
+@imports_router.get("/imports/{job_id}", response_model=ImportJobResponse)
+async def get_import(
+    job_id: str,
+    user: Annotated[dict, Depends(authenticated_claims)]
+):
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Invalid job ID")
+
+    job = await find_job(job_id)
+    if not job or not job["kind"].startswith("import_"):
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Import not found")
+    if job["created_by"] != user["id"] and user["role"] != "admin":
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "You can only view your own imports")
+
+    return {"data": job}
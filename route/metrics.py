@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from dependencies.authn import token_versions, user_cache
+from dependencies.authz import has_roles
+from services import cache, profiling
+from services.enrollments import learner_courses_cache, tutor_courses_cache
+from services.metrics import render_gauges, render_histograms
+from services.imports import import_worker
+from services.propagation import propagator
+from services.pubsub import broker
+from services.reminders import dispatcher
+
+metrics_router = APIRouter(tags=["Monitoring"])
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics():
+    caches = {
+        "user": user_cache.stats(),
+        "token_version": token_versions.stats(),
+        "learner_courses": learner_courses_cache.stats(),
+        "tutor_courses": tutor_courses_cache.stats(),
+    }
+    if isinstance(cache.backend, cache.MemoryBackend):
+        caches["response"] = cache.backend.stats()
+
+    lines = render_histograms()
+    for field in ["hits", "misses", "size"]:
+        lines += render_gauges(
+            f"cache_{field}", f"In-process cache {field}.", "cache",
+            {name: stats[field] for name, stats in caches.items()},
+        )
+    lines += render_gauges(
+        "reminder_dispatcher", "Reminder dispatcher counters.", "stat",
+        {key: value for key, value in dispatcher.stats().items() if key != "owner"},
+    )
+    lines += render_gauges(
+        "username_propagator", "Username propagation counters.", "stat",
+        {key: value for key, value in propagator.stats().items() if key != "owner"},
+    )
+    lines += render_gauges(
+        "import_worker", "Bulk import worker counters.", "stat",
+        {key: value for key, value in import_worker.stats().items() if key != "owner"},
+    )
+    lines += render_gauges("stream_subscribers", "Open live update streams.", "source", {"broker": broker.subscriber_count()})
+    return "\n".join(lines) + "\n"
+
+@metrics_router.get("/debug/profile", response_class=PlainTextResponse, dependencies=[Depends(has_roles(["admin"]))])
+async def get_profile_samples(seconds: float = 10):
+    if not profiling.PROFILER_ENABLED:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Profiling is disabled")
+
+    stacks = await run_in_threadpool(profiling.sample, min(max(seconds, 0.1), profiling.MAX_PROFILE_SECONDS))
+    if stacks is None:
+        raise HTTPException(status.HTTP_409_CONFLICT, "A profile is already running")
+    return profiling.collapsed(stacks)
@@ -1,29 +1,59 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status, Depends
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, Form, HTTPException, status, Depends
 from typing import Annotated, List
-import cloudinary
-import cloudinary.uploader
-import os
-from db import resources_collection, courses_collection, enrollments_collection
+from db import async_resources_collection, async_courses_collection, async_enrollments_collection
 from bson.objectid import ObjectId
-from utils import replace_mongo_id
-from dependencies.authn import is_authenticated, authenticated_user
+from utils import RESOURCE_FILE_TYPES, MongoModel, Page, page_size, keyset_filter, keyset_sort, next_cursor
+from dependencies.authn import authenticated_claims
 from dependencies.authz import has_roles
+from services.uploads import UploadRoute, acquire_blob, receive_upload, release_resource_file, settle_resource, store_resource_file
 from datetime import datetime, timezone
 
-resources_router = APIRouter(tags=["Learning Resources"])
+
+class ResourceSummary(MongoModel):
+    title: str
+    description: str
+    course_id: str
+    resource_type: str
+    uploaded_by: str
+    uploaded_at: datetime
+    file_url: str | None = None
+    file_name: str | None = None
+    external_url: str | None = None
+    file_size: int | None = None
+    derivatives: dict[str, str] | None = None
+    status: str = "ready"
+
+resources_router = APIRouter(tags=["Learning Resources"], route_class=UploadRoute)
+
+RESOURCE_PROJECTION = {
+    "title": 1,
+    "description": 1,
+    "course_id": 1,
+    "resource_type": 1,
+    "uploaded_by": 1,
+    "uploaded_at": 1,
+    "file_url": 1,
+    "file_name": 1,
+    "external_url": 1,
+    "file_size": 1,
+    "derivatives": 1,
+    "status": 1,
+}
+RESOURCE_PAGE_FIELDS = ["uploaded_at", "_id"]
 
 @resources_router.post("/resources", dependencies=[Depends(has_roles(["admin", "tutor"]))])
-def upload_resource(
+async def upload_resource(
     title: Annotated[str, Form()],
     description: Annotated[str, Form()],
     course_id: Annotated[str, Form()],
-    resource_type: Annotated[str, Form()],  # pdf, video, link, document
-    user: Annotated[dict, Depends(authenticated_user)],
+    resource_type: Annotated[str, Form()],  # pdf, video, image, link, document
+    user: Annotated[dict, Depends(authenticated_claims)],
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(None),
     external_url: Annotated[str, Form()] = None
 ):
     # Verify user has access to the course
-    course = courses_collection.find_one({"_id": ObjectId(course_id)})
+    course = await async_courses_collection.find_one({"_id": ObjectId(course_id)})
     if not course or course["tutor_id"] != user["id"]:
         raise HTTPException(status.HTTP_403_FORBIDDEN, "Access denied to this course")
     
@@ -38,39 +68,89 @@ def upload_resource(
         "external_url": None
     }
     
-    if resource_type in ["pdf", "document", "video"] and file:
-        # Upload to Cloudinary
-        upload_result = cloudinary.uploader.upload(file.file)
-        resource_data["file_url"] = upload_result["secure_url"]
+    if resource_type in RESOURCE_FILE_TYPES and file:
+        # The file is already spooled; new content is pushed to storage after responding
+        path, size, content_hash = await receive_upload(file, resource_type)
+        blob, should_upload = await acquire_blob(content_hash, size)
         resource_data["file_name"] = file.filename
+        resource_data["file_size"] = size
+        resource_data["content_hash"] = content_hash
+        resource_data["status"] = "ready" if blob["status"] == "ready" else "pending"
+        resource_data["file_url"] = blob.get("file_url")
+        result = await async_resources_collection.insert_one(resource_data)
+        if resource_data["status"] == "pending" and not should_upload:
+            resource_data["status"] = await settle_resource(result.inserted_id, content_hash)
+        background_tasks.add_task(store_resource_file, path, file.filename, content_hash, should_upload)
+        return {
+            "message": "Resource uploaded successfully!" if resource_data["status"] == "ready" else "Resource received, processing upload",
+            "resource_id": str(result.inserted_id),
+            "status": resource_data["status"]
+        }
     elif resource_type == "link" and external_url:
         resource_data["external_url"] = external_url
+        resource_data["status"] = "ready"
     else:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid resource type or missing file/URL")
     
-    result = resources_collection.insert_one(resource_data)
-    return {"message": "Resource uploaded successfully!", "resource_id": str(result.inserted_id)}
+    result = await async_resources_collection.insert_one(resource_data)
+    return {"message": "Resource uploaded successfully!", "resource_id": str(result.inserted_id), "status": "ready"}
 
-@resources_router.get("/resources/course/{course_id}")
-def get_course_resources(
+@resources_router.get("/resources/course/{course_id}", response_model=Page[ResourceSummary])
+async def get_course_resources(
     course_id: str,
-    user: Annotated[dict, Depends(authenticated_user)]
+    user: Annotated[dict, Depends(authenticated_claims)],
+    limit: int = 20,
+    cursor: str | None = None
 ):
     if not ObjectId.is_valid(course_id):
         raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Invalid course ID")
     
     # Check if user is enrolled or is the tutor
-    course = courses_collection.find_one({"_id": ObjectId(course_id)})
+    course = await async_courses_collection.find_one({"_id": ObjectId(course_id)})
     if not course:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Course not found")
     
     if user["role"] == "learner":
-        enrollment = enrollments_collection.find_one({
+        enrollment = await async_enrollments_collection.find_one({
             "course_id": course_id,
-            "learner_id": user["id"]
+            "learner_id": user["id"],
+            "status": "active"
         })
         if not enrollment:
             raise HTTPException(status.HTTP_403_FORBIDDEN, "Not enrolled in this course")
     
-    resources = list(resources_collection.find({"course_id": course_id}).sort("uploaded_at", -1))
-    return {"data": list(map(replace_mongo_id, resources))}
\ No newline at end of file
+    # Learners only see resources whose upload has finished
+    query_filter = {"course_id": course_id}
+    if user["role"] == "learner":
+        query_filter["status"] = {"$nin": ["pending", "failed"]}
+    
+    limit = page_size(limit)
+    resources = await async_resources_collection.find(
+        filter=keyset_filter(query_filter, RESOURCE_PAGE_FIELDS, cursor),
+        projection=RESOURCE_PROJECTION,
+        sort=keyset_sort(RESOURCE_PAGE_FIELDS),
+        limit=limit + 1,
+    ).to_list()
+    cursor = next_cursor(resources, limit, RESOURCE_PAGE_FIELDS)
+    return {"data": resources, "next_cursor": cursor}
+
+@resources_router.delete("/resources/{resource_id}", dependencies=[Depends(has_roles(["admin", "tutor"]))])
+async def delete_resource(
+    resource_id: str,
+    user: Annotated[dict, Depends(authenticated_claims)]
+):
+    if not ObjectId.is_valid(resource_id):
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Invalid resource ID")
+    
+    resource_filter = {"_id": ObjectId(resource_id)}
+    if user["role"] == "tutor":
+        resource_filter["uploaded_by"] = user["id"]
+    
+    resource = await async_resources_collection.find_one_and_delete(resource_filter)
+    if not resource:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Resource not found")
+    
+    # The stored file is only removed once no other resource points at it
+    await release_resource_file(resource)
+    
+    return {"message": "Resource deleted successfully!"}
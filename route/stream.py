@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from typing import Annotated
+import asyncio
+import json
+import os
+from bson.objectid import ObjectId
+from dependencies.authn import authenticated_claims
+from services.enrollments import can_view_course
+from services.pubsub import announcements_channel, attendance_channel, broker
+
+stream_router = APIRouter(tags=["Live Updates"])
+
+HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+async def event_stream(subscription):
+    try:
+        yield "retry: 3000\n\n"
+        while not subscription.overflowed:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Comment lines keep proxies from closing an idle connection
+                yield ": heartbeat\n\n"
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+@stream_router.get("/stream/courses/{course_id}")
+async def stream_course_events(
+    course_id: str,
+    user: Annotated[dict, Depends(authenticated_claims)]
+):
+    if not ObjectId.is_valid(course_id):
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Invalid course ID")
+
+    if not await can_view_course(user, course_id):
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Access denied to this course")
+
+    # Learners hear announcements; tutors and admins also watch check-ins arrive
+    channels = [announcements_channel(course_id)]
+    if user["role"] in ["admin", "tutor"]:
+        channels.append(attendance_channel(course_id))
+
+    return StreamingResponse(
+        event_stream(broker.subscribe(channels)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
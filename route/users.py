@@ -2,14 +2,20 @@ from enum import Enum
 from fastapi import APIRouter, Depends, HTTPException, status, Form
 from typing import Annotated
 from pydantic import EmailStr, BaseModel
-from db import users_collection
+from db import async_users_collection
 from bson import ObjectId
-import bcrypt
+from pymongo.errors import DuplicateKeyError
+from utils import MongoModel
 import jwt
 import os
 from datetime import datetime, timezone, timedelta
-from dependencies.authn import is_authenticated, authenticated_user
+from dependencies.authn import is_authenticated, authenticated_user, invalidate_user
 from dependencies.authz import has_roles
+from services.cache import invalidate
+from services.enrollments import invalidate_learner_courses, invalidate_taught_courses
+from services.user_courses import invalidate_user_courses
+from services.propagation import queue_propagation
+from services.passwords import hash_password, verify_password, needs_rehash
 
 
 class UserRole(str, Enum):
@@ -32,6 +38,23 @@ class LoginUserRequest(BaseModel):
     password: str
 
 
+class UserProfile(MongoModel):
+    username: str
+    email: str
+    role: UserRole
+    phone: str = ""
+    bio: str = ""
+    created_at: datetime | None = None
+
+
+class ProfileResponse(BaseModel):
+    data: UserProfile
+
+
+class UpdateRoleRequest(BaseModel):
+    role: UserRole
+
+
 class UpdateProfileRequest(BaseModel):
     username: str | None = None
     email: EmailStr | None = None
@@ -41,48 +64,56 @@ class UpdateProfileRequest(BaseModel):
 users_router = APIRouter(tags=["Authentication"])
 
 @users_router.post("/users/register")
-def register_user(request: RegisterUserRequest):
+async def register_user(request: RegisterUserRequest):
     if request.role == UserRole.ADMIN:
         raise HTTPException(
             status.HTTP_400_BAD_REQUEST,
             "Cannot register as admin! Admin role is assigned manually.",
         )
 
-    user_count = users_collection.count_documents(filter={"email": request.email})
-    if user_count > 0:
+    hashed_password = await hash_password(request.password)
+
+    # The unique email index rejects duplicates atomically
+    try:
+        await async_users_collection.insert_one({
+            "username": request.username,
+            "email": request.email,
+            "password": hashed_password,
+            "role": request.role,
+            "phone": request.phone or "",
+            "bio": request.bio or "",
+            "created_at": datetime.now(tz=timezone.utc)
+        })
+    except DuplicateKeyError:
         raise HTTPException(status.HTTP_409_CONFLICT, "User already exists")
 
-    hashed_password = bcrypt.hashpw(request.password.encode("utf-8"), bcrypt.gensalt())
-
-    users_collection.insert_one({
-        "username": request.username,
-        "email": request.email,
-        "password": hashed_password,
-        "role": request.role,
-        "phone": request.phone or "",
-        "bio": request.bio or "",
-        "created_at": datetime.now(tz=timezone.utc)
-    })
-
     return {"message": "User registered successfully!"}
 
 @users_router.post("/users/login")
-def login_user(request: LoginUserRequest):
-    user_in_db = users_collection.find_one(filter={"email": request.email})
+async def login_user(request: LoginUserRequest):
+    user_in_db = await async_users_collection.find_one(filter={"email": request.email})
 
     if not user_in_db:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "User does not exist!")
 
     hashed_password_in_db = user_in_db["password"]
-    correct_password = bcrypt.checkpw(request.password.encode("utf-8"), hashed_password_in_db)
+    correct_password = await verify_password(request.password, hashed_password_in_db)
 
     if not correct_password:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Incorrect email or password")
 
+    # Upgrade the stored hash when the configured cost factor has changed
+    if needs_rehash(hashed_password_in_db):
+        await async_users_collection.update_one(
+            {"_id": user_in_db["_id"]},
+            {"$set": {"password": await hash_password(request.password)}}
+        )
+
     encoded_jwt = jwt.encode(
         {
             "id": str(user_in_db["_id"]),
             "role": user_in_db["role"],
+            "ver": user_in_db.get("token_version", 0),
             "exp": datetime.now(tz=timezone.utc) + timedelta(hours=24),
         },
         os.getenv("JWT_SECRET_KEY"),
@@ -96,12 +127,12 @@ def login_user(request: LoginUserRequest):
         "user_id": str(user_in_db["_id"])
     }
 
-@users_router.get("/users/profile", dependencies=[Depends(is_authenticated)])
+@users_router.get("/users/profile", response_model=ProfileResponse, dependencies=[Depends(is_authenticated)])
 def get_profile(user: Annotated[dict, Depends(authenticated_user)]):
     return {"data": user}
 
 @users_router.put("/users/profile", dependencies=[Depends(is_authenticated)])
-def update_profile(
+async def update_profile(
     user: Annotated[dict, Depends(authenticated_user)],
     username: str = Form(None),
     email: str = Form(None),
@@ -119,9 +150,39 @@ def update_profile(
         update_fields['bio'] = bio
 
     if update_fields:
-        users_collection.update_one(
-            {"_id": ObjectId(user["id"])},
-            {"$set": update_fields}
-        )
-
-    return {"message": "Profile updated successfully!"}
\ No newline at end of file
+        # The unique email index rejects an address that is already taken
+        try:
+            await async_users_collection.update_one(
+                {"_id": ObjectId(user["id"])},
+                {"$set": update_fields}
+            )
+        except DuplicateKeyError:
+            raise HTTPException(status.HTTP_409_CONFLICT, "Email is already in use")
+        invalidate_user(user["id"])
+        # Tutor details are served from the public response cache
+        if user["role"] != "learner":
+            await invalidate("tutors")
+        # Copies of the name in other collections are rewritten in the background
+        if username is not None and username != user["username"]:
+            await queue_propagation(user["id"])
+
+    return {"message": "Profile updated successfully!"}
+
+@users_router.put("/users/{user_id}/role", dependencies=[Depends(has_roles(["admin"]))])
+async def update_user_role(user_id: str, request: UpdateRoleRequest):
+    if not ObjectId.is_valid(user_id):
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Invalid user ID")
+
+    # Bumping token_version revokes tokens that still carry the old role
+    result = await async_users_collection.update_one(
+        {"_id": ObjectId(user_id)},
+        {"$set": {"role": request.role}, "$inc": {"token_version": 1}}
+    )
+    if not result.matched_count:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "User not found")
+
+    invalidate_user(user_id)
+    invalidate_learner_courses(user_id)
+    invalidate_taught_courses(user_id)
+    await invalidate_user_courses(user_id)
+    return {"message": "Role updated successfully! The user must log in again."}
@@ -0,0 +1,202 @@
+from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
+from db import (
+    attendance_collection,
+    attendance_daily_collection,
+    async_attendance_course_stats_collection,
+    async_attendance_daily_collection,
+    async_attendance_learner_stats_collection,
+)
+
+# Attendance rollups, updated on every check-in:
+#
+#   attendance_course_stats   one doc per course: sessions held, total check-ins
+#   attendance_daily          one doc per course and day: headcount, session number
+#   attendance_learner_stats  one doc per course and learner: check-ins, streaks
+#
+# A "session" is a day on which at least one learner checked in, numbered
+# per course. Streaks count consecutive sessions attended, so weekly
+# classes aren't penalised for the days in between.
+
+def attendance_day(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d")
+
+async def record_checkins(course_id: str, learner_ids: list, day: str):
+    """Fold a batch of same-day check-ins for one course into the rollups."""
+    if not learner_ids:
+        return
+
+    # Allocate the session number atomically on the course summary
+    course_stats = await async_attendance_course_stats_collection.find_one_and_update(
+        {"_id": course_id},
+        [{"$set": {
+            "sessions": {"$add": [
+                {"$ifNull": ["$sessions", 0]},
+                {"$cond": [{"$eq": ["$last_day", day]}, 0, 1]},
+            ]},
+            "checkins": {"$add": [{"$ifNull": ["$checkins", 0]}, len(learner_ids)]},
+            "last_day": day,
+        }}],
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    session = course_stats["sessions"]
+
+    await async_attendance_daily_collection.update_one(
+        {"course_id": course_id, "day": day},
+        {"$inc": {"count": len(learner_ids)}, "$setOnInsert": {"session": session}},
+        upsert=True,
+    )
+
+    await async_attendance_learner_stats_collection.bulk_write(
+        [
+            UpdateOne(
+                {"course_id": course_id, "learner_id": learner_id},
+                _learner_update(session),
+                upsert=True,
+            )
+            for learner_id in learner_ids
+        ],
+        ordered=False,
+    )
+
+def current_streak(learner_stats: dict, course_stats: dict, today: str) -> int:
+    """A streak survives until a session passes without the learner.
+
+    Today's session only counts against it once the learner has had the
+    chance to check in, i.e. never while it is still today.
+    """
+    sessions = course_stats.get("sessions", 0)
+    if course_stats.get("last_day") == today:
+        sessions -= 1
+    if learner_stats.get("last_session", 0) >= sessions:
+        return learner_stats.get("streak", 0)
+    return 0
+
+def attendance_rate(learner_stats: dict, course_stats: dict) -> float:
+    sessions = course_stats.get("sessions", 0)
+    return round(learner_stats.get("checkins", 0) / sessions, 4) if sessions else 0.0
+
+def _learner_update(session: int) -> list:
+    same_session = {"$eq": ["$last_session", session]}
+    return [
+        {"$set": {
+            "checkins": {"$add": [
+                {"$ifNull": ["$checkins", 0]},
+                {"$cond": [same_session, 0, 1]},
+            ]},
+            "streak": {"$switch": {
+                "branches": [
+                    {"case": same_session, "then": "$streak"},
+                    {"case": {"$eq": ["$last_session", session - 1]}, "then": {"$add": ["$streak", 1]}},
+                ],
+                "default": 1,
+            }},
+            "last_session": session,
+        }},
+        {"$set": {"longest_streak": {"$max": [{"$ifNull": ["$longest_streak", 0]}, "$streak"]}}},
+    ]
+
+def backfill():
+    """Rebuild every rollup from raw attendance with aggregation pipelines."""
+    # One row per course/day with its headcount and session number
+    attendance_collection.aggregate([
+        {"$group": {
+            "_id": {
+                "course_id": "$course_id",
+                "learner_id": "$learner_id",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}},
+            },
+        }},
+        {"$group": {
+            "_id": {"course_id": "$_id.course_id", "day": "$_id.day"},
+            "count": {"$sum": 1},
+        }},
+        {"$setWindowFields": {
+            "partitionBy": "$_id.course_id",
+            "sortBy": {"_id.day": 1},
+            "output": {"session": {"$documentNumber": {}}},
+        }},
+        {"$project": {"_id": 0, "course_id": "$_id.course_id", "day": "$_id.day", "count": 1, "session": 1}},
+        {"$merge": {
+            "into": "attendance_daily",
+            "on": ["course_id", "day"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }},
+    ])
+
+    attendance_daily_collection.aggregate([
+        {"$group": {
+            "_id": "$course_id",
+            "sessions": {"$max": "$session"},
+            "checkins": {"$sum": "$count"},
+            "last_day": {"$max": "$day"},
+        }},
+        {"$merge": {"into": "attendance_course_stats", "on": "_id", "whenMatched": "replace"}},
+    ])
+
+    # Consecutive sessions share the same (session - rank) value, which
+    # splits each learner's history into runs
+    attendance_collection.aggregate([
+        {"$group": {
+            "_id": {
+                "course_id": "$course_id",
+                "learner_id": "$learner_id",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}},
+            },
+        }},
+        {"$lookup": {
+            "from": "attendance_daily",
+            "let": {"course_id": "$_id.course_id", "day": "$_id.day"},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$course_id", "$$course_id"]},
+                    {"$eq": ["$day", "$$day"]},
+                ]}}},
+                {"$project": {"_id": 0, "session": 1}},
+            ],
+            "as": "daily",
+        }},
+        {"$set": {"session": {"$first": "$daily.session"}}},
+        {"$setWindowFields": {
+            "partitionBy": {"course_id": "$_id.course_id", "learner_id": "$_id.learner_id"},
+            "sortBy": {"session": 1},
+            "output": {"rank": {"$documentNumber": {}}},
+        }},
+        {"$group": {
+            "_id": {
+                "course_id": "$_id.course_id",
+                "learner_id": "$_id.learner_id",
+                "run": {"$subtract": ["$session", "$rank"]},
+            },
+            "length": {"$sum": 1},
+            "last_session": {"$max": "$session"},
+        }},
+        {"$group": {
+            "_id": {"course_id": "$_id.course_id", "learner_id": "$_id.learner_id"},
+            "checkins": {"$sum": "$length"},
+            "longest_streak": {"$max": "$length"},
+            "latest_run": {"$max": {"last_session": "$last_session", "length": "$length"}},
+        }},
+        {"$project": {
+            "_id": 0,
+            "course_id": "$_id.course_id",
+            "learner_id": "$_id.learner_id",
+            "checkins": 1,
+            "longest_streak": 1,
+            "streak": "$latest_run.length",
+            "last_session": "$latest_run.last_session",
+        }},
+        {"$merge": {
+            "into": "attendance_learner_stats",
+            "on": ["course_id", "learner_id"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }},
+    ])
+
+if __name__ == "__main__":
+    # Usage: python -m services.attendance_stats
+    backfill()
+    print("Attendance rollups rebuilt")
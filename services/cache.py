@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+from fastapi import Response, status
+from utils import TTLCache
+
+# Response cache for public, read-heavy endpoints.
+#
+# Entries are stored as rendered JSON bytes under keys built from the
+# namespace, the namespace's current generation and the normalized request
+# parameters. Invalidating a namespace bumps its generation, so stale entries
+# are never read again and simply age out.
+#
+# Backends (RESPONSE_CACHE_BACKEND):
+#   memory  per-process LRU; invalidation is local, TTL bounds staleness
+#           on other replicas
+#   redis   shared by all replicas via REDIS_URL; needs `pip install redis`
+
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "60"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+CACHE_MAX_AGE = int(os.getenv("CACHE_MAX_AGE", "30"))
+
+class MemoryBackend:
+    def __init__(self, maxsize: int, ttl: float):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.generations = {}
+
+    async def generation(self, namespace: str) -> int:
+        return self.generations.get(namespace, 0)
+
+    async def bump(self, namespace: str):
+        self.generations[namespace] = self.generations.get(namespace, 0) + 1
+
+    async def get(self, key: str) -> bytes | None:
+        return self.entries.get(key)
+
+    async def set(self, key: str, value: bytes):
+        self.entries.set(key, value)
+
+    def stats(self) -> dict:
+        return self.entries.stats()
+
+class RedisBackend:
+    def __init__(self, url: str, ttl: int):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.ttl = ttl
+
+    async def generation(self, namespace: str) -> int:
+        return int(await self.client.get(f"cache-generation:{namespace}") or 0)
+
+    async def bump(self, namespace: str):
+        await self.client.incr(f"cache-generation:{namespace}")
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes):
+        await self.client.set(key, value, ex=self.ttl)
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "ttl": self.ttl}
+
+def get_backend():
+    if os.getenv("RESPONSE_CACHE_BACKEND", "memory") == "redis":
+        return RedisBackend(os.getenv("REDIS_URL", "redis://localhost:6379/0"), RESPONSE_CACHE_TTL)
+    return MemoryBackend(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+backend = get_backend()
+
+async def invalidate(*namespaces: str):
+    for namespace in namespaces:
+        await backend.bump(namespace)
+
+async def cached_response(namespace: str, params: dict, compute, if_none_match: str | None = None) -> Response:
+    """Serve the model returned by `await compute()` from the cache, rendering it only on a miss."""
+    generation = await backend.generation(namespace)
+    key = f"response:{namespace}:{generation}:{json.dumps(params, sort_keys=True, default=str)}"
+    body = await backend.get(key)
+    if body is None:
+        body = (await compute()).model_dump_json().encode("utf-8")
+        await backend.set(key, body)
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={CACHE_MAX_AGE}"}
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from fastapi.concurrency import run_in_threadpool
+from db import async_derivatives_collection, async_resources_collection
+from services.metrics import timed
+from services.rendering import render
+from services.storage import get_storage
+from utils import file_extension
+
+logger = logging.getLogger(__name__)
+
+# Thumbnails and previews for uploaded resources.
+#
+# Rendering is CPU-bound, so it runs in a small process pool whose workers
+# only load services.rendering. Results are
+# cached in `derivatives` by the content hash of the original file, so an
+# identical file uploaded again reuses the stored derivatives instead of
+# being rendered a second time. PDF previews and video posters need
+# `pdftoppm` and `ffmpeg` on the PATH and are skipped when they are missing.
+
+DERIVATIVE_WORKERS = int(os.getenv("DERIVATIVE_WORKERS", "2"))
+
+_executor = None
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=DERIVATIVE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+async def build_derivatives(path: str, filename: str, content_hash: str):
+    """Attach derivatives to every resource with this content, rendering at most once."""
+    cached = await async_derivatives_collection.find_one({"_id": content_hash})
+    if cached:
+        derivatives = cached["derivatives"]
+    else:
+        extension = file_extension(filename)
+        with tempfile.TemporaryDirectory(prefix="bridgelms-derivatives-") as workdir:
+            with timed("render"):
+                rendered = await asyncio.get_running_loop().run_in_executor(
+                    _get_executor(), render, path, extension, workdir
+                )
+            derivatives = {}
+            stored_objects = []
+            for name, rendered_path in rendered.items():
+                stored = await run_in_threadpool(get_storage().save, rendered_path, os.path.basename(rendered_path))
+                derivatives[name] = stored["url"]
+                stored_objects.append(stored)
+        await async_derivatives_collection.update_one(
+            {"_id": content_hash},
+            {"$setOnInsert": {"derivatives": derivatives, "stored": stored_objects}},
+            upsert=True,
+        )
+
+    if derivatives:
+        await async_resources_collection.update_many(
+            {"content_hash": content_hash}, {"$set": {"derivatives": derivatives}}
+        )
+
+async def delete_derivatives(content_hash: str):
+    """Drop the cached derivatives for content that is no longer referenced."""
+    cached = await async_derivatives_collection.find_one_and_delete({"_id": content_hash})
+    for stored in (cached or {}).get("stored", []):
+        await run_in_threadpool(get_storage().delete, stored)
+
+def shutdown():
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
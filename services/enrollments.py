@@ -0,0 +1,94 @@
+import os
+from pymongo import UpdateOne
+from db import courses_collection, enrollments_collection, async_courses_collection, async_enrollments_collection
+from utils import TTLCache
+
+# Active course ids per learner. Only positive answers are trusted: a course
+# missing from the cached set is re-checked against Mongo, so an enrollment
+# made on another replica is never rejected, while hot paths like check-in
+# skip the enrollment lookup entirely.
+learner_courses_cache = TTLCache(
+    maxsize=int(os.getenv("ENROLLMENT_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("ENROLLMENT_CACHE_TTL", "60")),
+)
+
+async def active_course_ids(learner_id: str, refresh: bool = False) -> frozenset:
+    course_ids = None if refresh else learner_courses_cache.get(learner_id)
+    if course_ids is None:
+        enrollments = await async_enrollments_collection.find(
+            {"learner_id": learner_id, "status": "active"}, {"_id": 0, "course_id": 1}
+        ).to_list()
+        course_ids = frozenset(enrollment["course_id"] for enrollment in enrollments)
+        learner_courses_cache.set(learner_id, course_ids)
+    return course_ids
+
+async def is_enrolled(learner_id: str, course_id: str) -> bool:
+    if course_id in await active_course_ids(learner_id):
+        return True
+    return course_id in await active_course_ids(learner_id, refresh=True)
+
+def invalidate_learner_courses(learner_id: str):
+    learner_courses_cache.invalidate(learner_id)
+
+# Course ids per tutor, invalidated when the tutor creates a course
+tutor_courses_cache = TTLCache(
+    maxsize=int(os.getenv("ENROLLMENT_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("ENROLLMENT_CACHE_TTL", "60")),
+)
+
+async def taught_course_ids(tutor_id: str, refresh: bool = False) -> frozenset:
+    course_ids = None if refresh else tutor_courses_cache.get(tutor_id)
+    if course_ids is None:
+        courses = await async_courses_collection.find({"tutor_id": tutor_id}, {"_id": 1}).to_list()
+        course_ids = frozenset(str(course["_id"]) for course in courses)
+        tutor_courses_cache.set(tutor_id, course_ids)
+    return course_ids
+
+async def is_teaching(tutor_id: str, course_id: str) -> bool:
+    if course_id in await taught_course_ids(tutor_id):
+        return True
+    return course_id in await taught_course_ids(tutor_id, refresh=True)
+
+def invalidate_taught_courses(tutor_id: str):
+    tutor_courses_cache.invalidate(tutor_id)
+
+async def can_view_course(user: dict, course_id: str) -> bool:
+    """Like visible_course_ids for one course, re-checking Mongo on a cache miss."""
+    if user["role"] == "admin":
+        return True
+    if user["role"] == "tutor":
+        return await is_teaching(user["id"], course_id)
+    return await is_enrolled(user["id"], course_id)
+
+async def visible_course_ids(user: dict) -> frozenset | None:
+    """Courses whose content the user can see; None means every course (admins)."""
+    if user["role"] == "admin":
+        return None
+    if user["role"] == "tutor":
+        return await taught_course_ids(user["id"])
+    return await active_course_ids(user["id"])
+
+def reconcile_enrolled_counts() -> int:
+    """Recompute every course's enrolled_count from its active enrollments.
+
+    Needed once for courses created before the counter existed, and safe to
+    re-run whenever the counter is suspected to have drifted.
+    """
+    counts = {
+        row["_id"]: row["count"]
+        for row in enrollments_collection.aggregate([
+            {"$match": {"status": "active"}},
+            {"$group": {"_id": "$course_id", "count": {"$sum": 1}}},
+        ])
+    }
+    updates = [
+        UpdateOne({"_id": course["_id"]}, {"$set": {"enrolled_count": counts.get(str(course["_id"]), 0)}})
+        for course in courses_collection.find({}, {"_id": 1})
+    ]
+    if not updates:
+        return 0
+    return courses_collection.bulk_write(updates, ordered=False).modified_count
+
+if __name__ == "__main__":
+    # Usage: python -m services.enrollments
+    print(f"Reconciled enrolled_count on {reconcile_enrolled_counts()} courses")
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import os
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from db import (
+    async_announcements_collection,
+    async_enrollments_collection,
+    async_feed_counters_collection,
+    async_inbox_collection,
+)
+
+logger = logging.getLogger(__name__)
+
+# Announcement feed, fanned out on write.
+#
+# Every active learner of a course gets an `inbox` entry carrying the
+# announcement itself, so reading a feed is one indexed range over the
+# learner's own entries rather than a scatter across all their courses.
+# `feed_counters` holds one unread count per learner. A learner who joins
+# a course later has its FEED_BACKFILL_LIMIT most recent announcements
+# copied into their inbox.
+
+FANOUT_BATCH_SIZE = int(os.getenv("FANOUT_BATCH_SIZE", "1000"))
+FEED_BACKFILL_LIMIT = int(os.getenv("FEED_BACKFILL_LIMIT", "50"))
+
+INBOX_FIELDS = ["title", "content", "course_id", "created_by", "created_by_name", "is_important", "created_at"]
+
+async def _deliver(announcement: dict, learner_ids: list):
+    entries = [
+        {
+            "learner_id": learner_id,
+            "announcement_id": str(announcement["_id"]),
+            "read": False,
+            **{field: announcement[field] for field in INBOX_FIELDS},
+        }
+        for learner_id in learner_ids
+    ]
+    # The unique (learner_id, announcement_id) index makes redelivery harmless
+    try:
+        await async_inbox_collection.insert_many(entries, ordered=False)
+    except BulkWriteError as e:
+        duplicates = {error["op"]["learner_id"] for error in e.details["writeErrors"] if error["code"] == 11000}
+        if len(duplicates) < len(e.details["writeErrors"]):
+            raise
+        learner_ids = [learner_id for learner_id in learner_ids if learner_id not in duplicates]
+    if learner_ids:
+        await async_feed_counters_collection.bulk_write(
+            [UpdateOne({"_id": learner_id}, {"$inc": {"unread": 1}}, upsert=True) for learner_id in learner_ids],
+            ordered=False,
+        )
+
+async def fan_out_announcement(announcement: dict):
+    """Background job: write the announcement into every enrolled learner's inbox."""
+    cursor = async_enrollments_collection.find(
+        {"course_id": announcement["course_id"], "status": "active"},
+        {"_id": 0, "learner_id": 1},
+        batch_size=FANOUT_BATCH_SIZE,
+    )
+    batch = []
+    delivered = 0
+    try:
+        async for enrollment in cursor:
+            batch.append(enrollment["learner_id"])
+            if len(batch) >= FANOUT_BATCH_SIZE:
+                await _deliver(announcement, batch)
+                delivered += len(batch)
+                batch = []
+        if batch:
+            await _deliver(announcement, batch)
+            delivered += len(batch)
+    except Exception:
+        logger.exception("Fan-out of announcement %s stopped after %d learners", announcement["_id"], delivered)
+
+async def backfill_inbox(course_id: str, learner_ids: list):
+    """Background job: give learners who just joined a course its recent announcements."""
+    try:
+        announcements = await async_announcements_collection.find(
+            {"course_id": course_id}, sort=[("created_at", -1)], limit=FEED_BACKFILL_LIMIT
+        ).to_list()
+        for announcement in announcements:
+            await _deliver(announcement, learner_ids)
+    except Exception:
+        logger.exception("Backfilling course %s announcements for %d learners failed", course_id, len(learner_ids))
+
+async def backfill_all_inboxes() -> int:
+    """Backfill every active enrollment, e.g. for announcements posted before fan-out existed."""
+    cursor = await async_enrollments_collection.aggregate([
+        {"$match": {"status": "active"}},
+        {"$group": {"_id": "$course_id", "learner_ids": {"$push": "$learner_id"}}},
+    ])
+    courses = 0
+    async for course in cursor:
+        for start in range(0, len(course["learner_ids"]), FANOUT_BATCH_SIZE):
+            await backfill_inbox(course["_id"], course["learner_ids"][start:start + FANOUT_BATCH_SIZE])
+        courses += 1
+    return courses
+
+if __name__ == "__main__":
+    # Usage: python -m services.feed
+    print(f"Backfilled inboxes for {asyncio.run(backfill_all_inboxes())} courses")
@@ -0,0 +1,465 @@
+import asyncio
+import csv
+import json
+import logging
+import os
+import socket
+import tempfile
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Literal
+from bson.objectid import ObjectId
+from fastapi import HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, EmailStr, ValidationError
+from pymongo.errors import BulkWriteError
+from gridfs.errors import NoFile
+from db import async_courses_collection, async_enrollments_collection, async_import_files_bucket, async_users_collection
+from services.cache import invalidate
+from services.enrollments import invalidate_learner_courses, invalidate_taught_courses
+from services.feed import backfill_inbox
+from services.jobs import claim_job, finish_job, queue_job, record_progress, renew_lease
+from services.passwords import hash_passwords
+from services.search import search_fields
+from services.user_courses import invalidate_many_user_courses
+
+logger = logging.getLogger(__name__)
+
+# Bulk imports of courses, users and enrollments.
+#
+# An upload is stored in the `import_files` GridFS bucket and queued as a
+# job. The import worker of whichever replica claims it reads the file back
+# IMPORT_BATCH_SIZE rows at a time. Rows are validated one by one and each
+# batch is written with a single unordered insert_many, so a bad or
+# duplicate row is reported against its line number without holding up the
+# rest. After every batch the job records its progress and a checkpoint of
+# the rows read, and renews its lease. If the replica dies, another one
+# claims the job once the lease lapses and resumes from the checkpoint. The
+# batch that was in flight is written again, and unique indexes (user email,
+# course and learner, the course's import row) report its rows as
+# duplicates instead of storing them twice.
+
+IMPORT_FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+MAX_IMPORT_BYTES = int(os.getenv("MAX_IMPORT_BYTES", str(100 * 1024 ** 2)))
+IMPORT_POLL_SECONDS = float(os.getenv("IMPORT_POLL_SECONDS", "2"))
+IMPORT_LEASE_SECONDS = int(os.getenv("IMPORT_LEASE_SECONDS", "300"))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+class CourseRow(BaseModel):
+    title: str
+    description: str
+    category: str
+    max_students: int = 50
+    is_public: bool = True
+    tutor_email: EmailStr | None = None
+
+
+class UserRow(BaseModel):
+    username: str
+    email: EmailStr
+    password: str
+    role: Literal["tutor", "learner"] = "learner"
+    phone: str = ""
+    bio: str = ""
+
+
+class EnrollmentRow(BaseModel):
+    course_id: str
+    learner_id: str | None = None
+    learner_email: EmailStr | None = None
+
+async def receive_import(file: UploadFile) -> tuple:
+    """Store an import file where any replica's worker can read it; returns (file id, format)."""
+    import_format = IMPORT_FORMATS.get(os.path.splitext(file.filename or "")[1].lower())
+    if not import_format:
+        raise HTTPException(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, "Upload a .csv or .ndjson file")
+
+    grid_in = async_import_files_bucket.open_upload_stream(file.filename or "import")
+    size = 0
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+            size += len(chunk)
+            if size > MAX_IMPORT_BYTES:
+                raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "File is too large")
+            await grid_in.write(chunk)
+        if size == 0:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, "Uploaded file is empty")
+    except BaseException:
+        await grid_in.abort()
+        raise
+    await grid_in.close()
+    return str(grid_in._id), import_format
+
+async def queue_import(kind: str, file: UploadFile, user: dict) -> str:
+    """Store the file and queue a job for the import worker; returns the job id."""
+    file_id, import_format = await receive_import(file)
+    # Course imports need the importer to decide who teaches each course
+    importer = {key: user[key] for key in ["id", "username", "email", "role"] if key in user}
+    return await queue_job(kind, user["id"], {
+        "file_id": file_id,
+        "file_name": file.filename,
+        "format": import_format,
+        "importer": importer,
+    })
+
+async def _download(file_id: str) -> str:
+    """Copy a stored import file to a private temp file and return its path."""
+    handle = tempfile.NamedTemporaryFile(prefix="bridgelms-import-", delete=False)
+    try:
+        grid_out = await async_import_files_bucket.open_download_stream(ObjectId(file_id))
+        while chunk := await grid_out.readchunk():
+            await run_in_threadpool(handle.write, chunk)
+    except BaseException:
+        handle.close()
+        os.remove(handle.name)
+        raise
+    handle.close()
+    return handle.name
+
+async def _delete_file(file_id: str):
+    try:
+        await async_import_files_bucket.delete(ObjectId(file_id))
+    except NoFile:
+        pass
+
+def _read_rows(path: str, import_format: str):
+    """Yield (line number, row) for each record; a str row is a parse error."""
+    with open(path, newline="", encoding="utf-8-sig") as source:
+        if import_format == "csv":
+            reader = csv.DictReader(source)
+            for row in reader:
+                # Blank cells fall back to the field defaults
+                yield reader.line_num, {key: value for key, value in row.items() if key and value not in ("", None)}
+        else:
+            for number, line in enumerate(source, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield number, json.loads(line)
+                except ValueError:
+                    yield number, "Invalid JSON"
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(map(str, detail['loc'])) or 'row'}: {detail['msg']}" for detail in error.errors()
+    )
+
+def _validate(batch: list, row_model: type[BaseModel]) -> tuple:
+    rows, errors = [], []
+    for number, row in batch:
+        if isinstance(row, str):
+            errors.append({"row": number, "error": row})
+            continue
+        try:
+            rows.append((number, row_model.model_validate(row)))
+        except ValidationError as e:
+            errors.append({"row": number, "error": _describe(e)})
+    return rows, errors
+
+async def _insert(collection, documents: list, duplicate_message: str) -> dict:
+    """Unordered insert_many; returns {index: message} for rejected documents."""
+    try:
+        await collection.insert_many(documents, ordered=False)
+        return {}
+    except BulkWriteError as e:
+        return {
+            error["index"]: duplicate_message if error["code"] == 11000 else error["errmsg"]
+            for error in e.details["writeErrors"]
+        }
+
+async def run_import(job_id: str, path: str, import_format: str, row_model: type[BaseModel], write_batch,
+                     checkpoint: int = 0, renew=None) -> bool:
+    """Validate and write the file batch by batch, recording progress on the job.
+
+    `write_batch` takes the valid (line number, row) pairs of a batch and
+    returns (rows written, errors). The first `checkpoint` rows were handled
+    by an earlier attempt and are skipped. `renew` is awaited before every
+    batch; once it returns False the job belongs to another worker and the
+    import stops, returning False.
+    """
+    batches = _read_rows(path, import_format)
+    try:
+        await run_in_threadpool(deque, islice(batches, checkpoint), 0)
+        while batch := await run_in_threadpool(list, islice(batches, IMPORT_BATCH_SIZE)):
+            if renew and not await renew():
+                return False
+            rows, errors = _validate(batch, row_model)
+            succeeded, failed = await write_batch(rows) if rows else (0, [])
+            errors = sorted(errors + failed, key=lambda error: error["row"])
+            checkpoint += len(batch)
+            await record_progress(job_id, len(batch), succeeded, errors, checkpoint=checkpoint)
+    finally:
+        batches.close()
+    return True
+
+def course_writer(user: dict, job_id: str):
+    """Courses are taught by the importer unless an admin names a tutor_email."""
+    async def write_batch(rows: list) -> tuple:
+        emails = {row.tutor_email for _, row in rows if row.tutor_email and row.tutor_email != user["email"]}
+        tutors = {user["email"]: {"_id": user["id"], "username": user["username"]}}
+        if emails and user["role"] == "admin":
+            found = await async_users_collection.find(
+                {"email": {"$in": list(emails)}, "role": {"$in": ["admin", "tutor"]}}, {"username": 1, "email": 1}
+            ).to_list()
+            tutors.update({tutor["email"]: tutor for tutor in found})
+
+        now = datetime.now(tz=timezone.utc)
+        numbers, documents, errors = [], [], []
+        for number, row in rows:
+            tutor = tutors.get(row.tutor_email or user["email"])
+            if not tutor:
+                message = "No tutor with this email" if user["role"] == "admin" else "Tutors can only import their own courses"
+                errors.append({"row": number, "error": message})
+                continue
+            numbers.append(number)
+            documents.append({
+                "title": row.title,
+                "description": row.description,
+                "category": row.category,
+                "max_students": row.max_students,
+                "enrolled_count": 0,
+                "is_public": row.is_public,
+                "tutor_id": str(tutor["_id"]),
+                "tutor_name": tutor["username"],
+                "created_at": now,
+                "is_active": True,
+                # Lets a resumed job recognise the courses it already created
+                "import_row": f"{job_id}:{number}",
+                **search_fields(row.title, row.description, row.category),
+            })
+        if not documents:
+            return 0, errors
+
+        rejected = await _insert(async_courses_collection, documents, "Course already imported")
+        errors += [{"row": numbers[index], "error": message} for index, message in rejected.items()]
+        tutor_ids = {course["tutor_id"] for index, course in enumerate(documents) if index not in rejected}
+        for tutor_id in tutor_ids:
+            invalidate_taught_courses(tutor_id)
+        await invalidate_many_user_courses(list(tutor_ids))
+        await invalidate("courses")
+        return len(documents) - len(rejected), errors
+
+    return write_batch
+
+async def write_users(rows: list) -> tuple:
+    # Skip known emails before hashing, which is where the time goes
+    existing = await async_users_collection.find(
+        {"email": {"$in": [row.email for _, row in rows]}}, {"_id": 0, "email": 1}
+    ).to_list()
+    taken = {user["email"] for user in existing}
+    numbers, fresh, errors = [], [], []
+    for number, row in rows:
+        if row.email in taken:
+            errors.append({"row": number, "error": "User already exists"})
+            continue
+        taken.add(row.email)
+        numbers.append(number)
+        fresh.append(row)
+    if not fresh:
+        return 0, errors
+
+    hashed = await hash_passwords([row.password for row in fresh])
+    now = datetime.now(tz=timezone.utc)
+    documents = [
+        {
+            "username": row.username,
+            "email": row.email,
+            "password": password,
+            "role": row.role,
+            "phone": row.phone,
+            "bio": row.bio,
+            "created_at": now,
+        }
+        for row, password in zip(fresh, hashed)
+    ]
+    rejected = await _insert(async_users_collection, documents, "User already exists")
+    errors += [{"row": numbers[index], "error": message} for index, message in rejected.items()]
+    return len(documents) - len(rejected), errors
+
+async def _reserve_seats(course_id: str, wanted: int) -> int | None:
+    """Take up to `wanted` free seats in one atomic update; None if the course is gone."""
+    current = {"$ifNull": ["$enrolled_count", 0]}
+    course = await async_courses_collection.find_one_and_update(
+        {"_id": ObjectId(course_id), "is_active": True},
+        [{"$set": {"enrolled_count": {"$max": [current, {"$min": ["$max_students", {"$add": [current, wanted]}]}]}}}],
+        projection={"enrolled_count": 1, "max_students": 1},
+    )
+    if course is None:
+        return None
+    return max(0, min(wanted, course["max_students"] - course.get("enrolled_count", 0)))
+
+async def write_enrollments(rows: list) -> tuple:
+    learner_ids = [ObjectId(row.learner_id) for _, row in rows if row.learner_id and ObjectId.is_valid(row.learner_id)]
+    emails = [row.learner_email for _, row in rows if not row.learner_id and row.learner_email]
+    learners = await async_users_collection.find(
+        {"role": "learner", "$or": [{"_id": {"$in": learner_ids}}, {"email": {"$in": emails}}]},
+        {"username": 1, "email": 1},
+    ).to_list()
+    by_id = {str(learner["_id"]): learner for learner in learners}
+    by_email = {learner["email"]: learner for learner in learners}
+
+    errors, candidates = [], []
+    for number, row in rows:
+        learner = by_id.get(row.learner_id) if row.learner_id else by_email.get(row.learner_email)
+        if not row.learner_id and not row.learner_email:
+            errors.append({"row": number, "error": "learner_id or learner_email is required"})
+        elif not learner:
+            errors.append({"row": number, "error": "Learner not found"})
+        elif not ObjectId.is_valid(row.course_id):
+            errors.append({"row": number, "error": "Invalid course ID"})
+        else:
+            candidates.append((number, row.course_id, learner))
+
+    # Drop existing enrollments and repeats before reserving seats, so that
+    # re-running a corrected file doesn't waitlist rows behind them
+    learners_by_course = {}
+    for _, course_id, learner in candidates:
+        learners_by_course.setdefault(course_id, set()).add(str(learner["_id"]))
+    existing = await async_enrollments_collection.find(
+        {"$or": [
+            {"course_id": course_id, "learner_id": {"$in": list(learner_ids)}}
+            for course_id, learner_ids in learners_by_course.items()
+        ]},
+        {"_id": 0, "course_id": 1, "learner_id": 1},
+    ).to_list() if candidates else []
+    seen = {(enrollment["course_id"], enrollment["learner_id"]) for enrollment in existing}
+    requested = {}
+    for number, course_id, learner in candidates:
+        key = (course_id, str(learner["_id"]))
+        if key in seen:
+            errors.append({"row": number, "error": "Already enrolled in this course"})
+            continue
+        seen.add(key)
+        requested.setdefault(course_id, []).append((number, learner))
+
+    # Seats are handed out in file order; the rest of a course's rows are waitlisted
+    now = datetime.now(tz=timezone.utc)
+    numbers, documents = [], []
+    for course_id, entries in requested.items():
+        seats = await _reserve_seats(course_id, len(entries))
+        if seats is None:
+            errors += [{"row": number, "error": "Course not found"} for number, _ in entries]
+            continue
+        for position, (number, learner) in enumerate(entries):
+            numbers.append(number)
+            documents.append({
+                "course_id": course_id,
+                "learner_id": str(learner["_id"]),
+                "learner_name": learner["username"],
+                "enrolled_at": now,
+                "status": "active" if position < seats else "waitlisted",
+            })
+    if not documents:
+        return 0, errors
+
+    rejected = await _insert(async_enrollments_collection, documents, "Already enrolled in this course")
+    errors += [{"row": numbers[index], "error": message} for index, message in rejected.items()]
+
+    # Give back seats reserved for rows that raced a concurrent enrollment
+    released, joined = {}, {}
+    for index, enrollment in enumerate(documents):
+        if enrollment["status"] != "active":
+            continue
+        if index in rejected:
+            released[enrollment["course_id"]] = released.get(enrollment["course_id"], 0) + 1
+        else:
+            joined.setdefault(enrollment["course_id"], []).append(enrollment["learner_id"])
+    for course_id, count in released.items():
+        await async_courses_collection.update_one({"_id": ObjectId(course_id)}, {"$inc": {"enrolled_count": -count}})
+
+    enrolled = {learner_id for learner_ids in joined.values() for learner_id in learner_ids}
+    for learner_id in enrolled:
+        invalidate_learner_courses(learner_id)
+    await invalidate_many_user_courses(list(enrolled))
+    for course_id, learner_ids in joined.items():
+        await backfill_inbox(course_id, learner_ids)
+    return len(documents) - len(rejected), errors
+
+IMPORT_ROW_MODELS = {
+    "import_courses": CourseRow,
+    "import_users": UserRow,
+    "import_enrollments": EnrollmentRow,
+}
+
+def batch_writer(job: dict):
+    if job["kind"] == "import_courses":
+        return course_writer(job["params"]["importer"], str(job["_id"]))
+    if job["kind"] == "import_users":
+        return write_users
+    return write_enrollments
+
+class ImportWorker:
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.completed = 0
+        self.failed = 0
+        self.lost = 0
+        self._task = None
+
+    async def process(self, job: dict):
+        job_id = str(job["_id"])
+        params = job["params"]
+        path = await _download(params["file_id"])
+        try:
+            finished = await run_import(
+                job_id, path, params["format"], IMPORT_ROW_MODELS[job["kind"]], batch_writer(job),
+                checkpoint=job.get("checkpoint", 0),
+                renew=lambda: renew_lease(job_id, self.owner, IMPORT_LEASE_SECONDS),
+            )
+        finally:
+            os.remove(path)
+        if not finished:
+            logger.warning("Import job %s was taken over by another worker", job_id)
+            self.lost += 1
+            return
+        await finish_job(job_id)
+        await _delete_file(params["file_id"])
+        self.completed += 1
+
+    async def run_once(self) -> bool:
+        job = await claim_job(list(IMPORT_ROW_MODELS), self.owner, IMPORT_LEASE_SECONDS)
+        if job is None:
+            return False
+        try:
+            await self.process(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Unlike a crash, an error here would only repeat on a retry
+            logger.exception("Import job %s failed", job["_id"])
+            self.failed += 1
+            await finish_job(str(job["_id"]), str(e))
+            await _delete_file(job["params"]["file_id"])
+        return True
+
+    async def run(self):
+        while True:
+            try:
+                claimed = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Import worker iteration failed")
+                claimed = False
+            if not claimed:
+                await asyncio.sleep(IMPORT_POLL_SECONDS)
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        return {"owner": self.owner, "completed": self.completed, "failed": self.failed, "lost": self.lost}
+
+import_worker = ImportWorker()
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from db import async_jobs_collection
+
+# Tracked background jobs. Each job is a document in `jobs` that its worker
+# updates after every batch, so clients can poll progress and per-row
+# errors while it runs. A background worker on any replica claims a queued
+# job with a lease and renews it as it goes, so a job whose replica died is
+# picked up again once the lease lapses. Only the first
+# MAX_REPORTED_ERRORS errors are kept; `failed` always holds the full count.
+
+MAX_REPORTED_ERRORS = 1000
+
+def _new_job(created_by: str) -> dict:
+    now = datetime.now(tz=timezone.utc)
+    return {
+        "created_by": created_by,
+        "processed": 0,
+        "succeeded": 0,
+        "failed": 0,
+        "errors": [],
+        "created_at": now,
+        "updated_at": now,
+    }
+
+async def queue_job(kind: str, created_by: str, params: dict) -> str:
+    """Create a queued job unless an identical one is already waiting; returns its id."""
+    job = await async_jobs_collection.find_one_and_update(
+        {"kind": kind, "status": "queued", "params": params},
+        {"$setOnInsert": _new_job(created_by)},
+        projection={"_id": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return str(job["_id"])
+
+async def claim_job(kind: str | list, owner: str, lease_seconds: int) -> dict | None:
+    """Lease the oldest waiting job of this kind (or kinds), or one whose lease has lapsed."""
+    now = datetime.now(tz=timezone.utc)
+    return await async_jobs_collection.find_one_and_update(
+        {
+            "kind": {"$in": kind} if isinstance(kind, list) else kind,
+            "$or": [{"status": "queued"}, {"status": "running", "lease_until": {"$lt": now}}],
+        },
+        {
+            "$set": {
+                "status": "running",
+                "lease_owner": owner,
+                "lease_until": now + timedelta(seconds=lease_seconds),
+                "updated_at": now,
+            },
+            "$min": {"started_at": now},
+        },
+        sort=[("_id", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+async def renew_lease(job_id: str, owner: str, lease_seconds: int) -> bool:
+    """Extend a claimed job's lease; False once another worker has taken it over."""
+    now = datetime.now(tz=timezone.utc)
+    result = await async_jobs_collection.update_one(
+        {"_id": ObjectId(job_id), "status": "running", "lease_owner": owner},
+        {"$set": {"lease_until": now + timedelta(seconds=lease_seconds), "updated_at": now}},
+    )
+    return result.matched_count == 1
+
+async def record_progress(job_id: str, processed: int, succeeded: int, errors: list, **fields):
+    """Add a batch's counts and errors; extra keyword arguments are $set on the job."""
+    update = {
+        "$inc": {"processed": processed, "succeeded": succeeded, "failed": len(errors)},
+        "$set": {"updated_at": datetime.now(tz=timezone.utc), **fields},
+    }
+    if errors:
+        update["$push"] = {"errors": {"$each": errors, "$slice": MAX_REPORTED_ERRORS}}
+    await async_jobs_collection.update_one({"_id": ObjectId(job_id)}, update)
+
+async def finish_job(job_id: str, error: str | None = None):
+    now = datetime.now(tz=timezone.utc)
+    fields = {"status": "failed" if error else "completed", "finished_at": now, "updated_at": now}
+    if error:
+        fields["error"] = error
+    await async_jobs_collection.update_one({"_id": ObjectId(job_id)}, {"$set": fields})
+
+async def find_job(job_id: str) -> dict | None:
+    return await async_jobs_collection.find_one({"_id": ObjectId(job_id)})
@@ -0,0 +1,203 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Request instrumentation.
+#
+# TimingMiddleware opens a per-request stats dict in a context variable.
+# Mongo commands (via MongoCommandListener, registered on both clients) and
+# `timed` blocks such as bcrypt add to it, so each request knows how much of
+# its time went to the database and to other slow dependencies. Totals feed
+# Prometheus-style histograms served from /metrics, go back to the client
+# in a Server-Timing header, and anything over the thresholds is logged with
+# the shape (not the values) of its filter.
+
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1.0"))
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "0.1"))
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+request_stats = ContextVar("request_stats", default=None)
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple, buckets: tuple = DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                label_text = ",".join(f'{name}="{value}"' for name, value in zip(self.labelnames, labels))
+                prefix = label_text + "," if label_text else ""
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series["count"]}')
+                lines.append(f"{self.name}_sum{{{label_text}}} {series['sum']}")
+                lines.append(f"{self.name}_count{{{label_text}}} {series['count']}")
+        return lines
+
+request_seconds = Histogram(
+    "http_request_duration_seconds", "Time to serve a request.", ("method", "route", "status")
+)
+request_mongo_seconds = Histogram(
+    "http_request_mongo_seconds", "Time a request spent in Mongo commands.", ("route",)
+)
+request_mongo_commands = Histogram(
+    "http_request_mongo_commands", "Mongo commands issued per request.", ("route",), COUNT_BUCKETS
+)
+mongo_command_seconds = Histogram(
+    "mongo_command_duration_seconds", "Mongo command round trip time.", ("command", "collection")
+)
+segment_seconds = Histogram(
+    "app_segment_duration_seconds", "Time spent in instrumented dependencies.", ("segment",)
+)
+HISTOGRAMS = [request_seconds, request_mongo_seconds, request_mongo_commands, mongo_command_seconds, segment_seconds]
+
+def new_request_stats() -> dict:
+    return {"mongo_commands": 0, "mongo_seconds": 0.0, "segments": {}}
+
+@contextmanager
+def timed(segment: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        segment_seconds.observe(elapsed, segment)
+        stats = request_stats.get()
+        if stats is not None:
+            stats["segments"][segment] = stats["segments"].get(segment, 0.0) + elapsed
+
+def query_shape(value):
+    """The structure of a filter with every literal replaced by "?"."""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+        return [query_shape(item) for item in value]
+    return "?"
+
+def _command_filter(command: dict):
+    for key in ("filter", "query"):
+        if key in command:
+            return command[key]
+    for key in ("updates", "deletes"):
+        if command.get(key):
+            return command[key][0].get("q")
+    if "pipeline" in command:
+        return command["pipeline"][:1]
+    return None
+
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        self._pending[(event.connection_id, event.request_id)] = event.command
+
+    def _finished(self, event):
+        command = self._pending.pop((event.connection_id, event.request_id), None)
+        seconds = event.duration_micros / 1_000_000
+        collection = command.get(event.command_name) if command else None
+        mongo_command_seconds.observe(seconds, event.command_name, collection if isinstance(collection, str) else "")
+
+        stats = request_stats.get()
+        if stats is not None:
+            stats["mongo_commands"] += 1
+            stats["mongo_seconds"] += seconds
+
+        if seconds >= SLOW_QUERY_SECONDS and command is not None:
+            logger.warning(
+                "Slow Mongo %s on %s took %.3fs, filter shape %s",
+                event.command_name, collection, seconds, query_shape(_command_filter(command)),
+            )
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+mongo_listener = MongoCommandListener()
+
+def _route_path(scope: dict) -> str:
+    route = scope.get("route")
+    # Unmatched paths share one label so scanners can't blow up cardinality
+    return getattr(route, "path", "unmatched")
+
+class TimingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = new_request_stats()
+        token = request_stats.set(stats)
+        start = time.perf_counter()
+        response = {"status": 500, "streaming": False}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                headers = dict(message.get("headers", []))
+                # Event streams stay open for minutes and would swamp the histograms
+                response["streaming"] = headers.get(b"content-type", b"").startswith(b"text/event-stream")
+                elapsed = time.perf_counter() - start
+                timings = [f"db;dur={stats['mongo_seconds'] * 1000:.1f}"]
+                timings += [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stats["segments"].items()]
+                timings.append(f"total;dur={elapsed * 1000:.1f}")
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", ", ".join(timings).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_stats.reset(token)
+            if not response["streaming"]:
+                self._record(scope, response["status"], time.perf_counter() - start, stats)
+
+    def _record(self, scope: dict, status_code: int, elapsed: float, stats: dict):
+        route = _route_path(scope)
+        request_seconds.observe(elapsed, scope["method"], route, str(status_code))
+        request_mongo_seconds.observe(stats["mongo_seconds"], route)
+        request_mongo_commands.observe(stats["mongo_commands"], route)
+        if elapsed >= SLOW_REQUEST_SECONDS:
+            logger.warning(
+                "Slow request %s %s -> %s took %.3fs (mongo: %d commands, %.3fs; %s)",
+                scope["method"], route, status_code, elapsed, stats["mongo_commands"], stats["mongo_seconds"],
+                ", ".join(f"{name}: {seconds:.3f}s" for name, seconds in stats["segments"].items()) or "no other segments",
+            )
+
+def render_gauges(name: str, documentation: str, label: str, values: dict) -> list:
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+    lines += [f'{name}{{{label}="{key}"}} {value}' for key, value in sorted(values.items())]
+    return lines
+
+def render_histograms() -> list:
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.render()
+    return lines
@@ -0,0 +1,64 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from fastapi import HTTPException, status
+from services.metrics import timed
+
+# bcrypt runs on its own bounded pool so a login storm can't starve the
+# threadpool and event loop that serve every other endpoint. bcrypt drops
+# the GIL while hashing, so threads scale across cores. Once
+# BCRYPT_WORKERS + BCRYPT_MAX_QUEUE hashes are in flight, further requests
+# are turned away with a 503 instead of queueing without bound.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(min(4, os.cpu_count() or 1))))
+BCRYPT_MAX_QUEUE = int(os.getenv("BCRYPT_MAX_QUEUE", "64"))
+# Bulk imports hash on a separate pool of BCRYPT_IMPORT_WORKERS threads, so
+# an import never holds a thread that logins are waiting for.
+BCRYPT_IMPORT_WORKERS = max(1, int(os.getenv("BCRYPT_IMPORT_WORKERS", str(BCRYPT_WORKERS - 1))))
+
+_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+_import_executor = ThreadPoolExecutor(max_workers=BCRYPT_IMPORT_WORKERS, thread_name_prefix="bcrypt-import")
+_in_flight = 0
+
+async def _run(fn, *args):
+    global _in_flight
+    if _in_flight >= BCRYPT_WORKERS + BCRYPT_MAX_QUEUE:
+        raise HTTPException(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            "Server is busy, please try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    _in_flight += 1
+    try:
+        with timed("bcrypt"):
+            return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        _in_flight -= 1
+
+async def hash_password(password: str) -> bytes:
+    return await _run(_hash, password.encode("utf-8"))
+
+async def hash_passwords(passwords: list) -> list:
+    """Hash many passwords in parallel for a bulk import, preserving order."""
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(
+        *(loop.run_in_executor(_import_executor, _hash, password.encode("utf-8")) for password in passwords)
+    )
+
+async def verify_password(password: str, hashed_password: bytes) -> bool:
+    return await _run(bcrypt.checkpw, password.encode("utf-8"), hashed_password)
+
+def needs_rehash(hashed_password: bytes) -> bool:
+    """True when the stored hash was made with a different cost factor."""
+    try:
+        return int(hashed_password.split(b"$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+def _hash(password: bytes) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=BCRYPT_ROUNDS))
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
+    _import_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,47 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# A tiny sampling profiler for looking at hot paths on a live replica.
+#
+# While a profile runs, a background thread snapshots the stack of every
+# other thread PROFILER_INTERVAL_MS apart and counts identical stacks. The
+# result is in collapsed-stack format ("frame;frame;frame count"), which
+# flamegraph.pl and speedscope read directly. Sampling costs nothing when
+# no profile is running, and it is only reachable when PROFILER_ENABLED=1.
+
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "5"))
+MAX_PROFILE_SECONDS = 60
+
+_lock = threading.Lock()
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+def sample(seconds: float, interval: float = PROFILER_INTERVAL_MS / 1000) -> Counter | None:
+    """Sample all threads for `seconds`; None if another profile is running."""
+    if not _lock.acquire(blocking=False):
+        return None
+    try:
+        own_thread = threading.get_ident()
+        stacks = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_thread:
+                    stacks[_collapse(frame)] += 1
+            time.sleep(interval)
+        return stacks
+    finally:
+        _lock.release()
+
+def collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from bson.objectid import ObjectId
+from db import async_bridgelms_db, async_users_collection
+from services.cache import invalidate
+from services.jobs import claim_job, finish_job, queue_job, record_progress
+
+logger = logging.getLogger(__name__)
+
+# Username propagation.
+#
+# Courses, enrollments, attendance, announcements and inbox entries keep a
+# copy of the username of the user they belong to, so reads never join on
+# `users`. When a username changes, a job rewrites those copies one target
+# at a time in batches of PROPAGATION_BATCH_SIZE, pausing between batches
+# to spread the write load. A batch only touches documents whose copy still
+# differs from the current username, which makes the work idempotent: a job
+# resumed from its checkpoint after a crash simply carries on. A verifier
+# samples copies every PROPAGATION_VERIFY_SECONDS and queues a job for any
+# user whose copies have drifted.
+
+PROPAGATION_KIND = "propagate_username"
+PROPAGATION_BATCH_SIZE = int(os.getenv("PROPAGATION_BATCH_SIZE", "500"))
+PROPAGATION_PAUSE_SECONDS = float(os.getenv("PROPAGATION_PAUSE_SECONDS", "0.1"))
+PROPAGATION_POLL_SECONDS = float(os.getenv("PROPAGATION_POLL_SECONDS", "5"))
+PROPAGATION_LEASE_SECONDS = int(os.getenv("PROPAGATION_LEASE_SECONDS", "60"))
+PROPAGATION_VERIFY_SECONDS = float(os.getenv("PROPAGATION_VERIFY_SECONDS", "3600"))
+PROPAGATION_VERIFY_SAMPLE = int(os.getenv("PROPAGATION_VERIFY_SAMPLE", "200"))
+
+# (collection, field holding the user id, field holding the username copy).
+# A dotted pair addresses entries of an array, as in user_courses.
+TARGETS = [
+    ("courses", "tutor_id", "tutor_name"),
+    ("enrollments", "learner_id", "learner_name"),
+    ("attendance", "learner_id", "learner_name"),
+    ("announcements", "created_by", "created_by_name"),
+    ("inbox", "created_by", "created_by_name"),
+    ("user_courses", "courses.tutor_id", "courses.tutor_name"),
+]
+
+def _stale_filter(id_field: str, name_field: str, user_id: str, username: str) -> dict:
+    if "." in id_field:
+        array, id_key = id_field.split(".")
+        name_key = name_field.split(".")[1]
+        return {array: {"$elemMatch": {id_key: user_id, name_key: {"$ne": username}}}}
+    return {id_field: user_id, name_field: {"$ne": username}}
+
+async def rename_batch(target: tuple, user_id: str, username: str) -> int | None:
+    """Rewrite one batch of stale copies; None once none are left."""
+    collection_name, id_field, name_field = target
+    collection = async_bridgelms_db[collection_name]
+    stale = _stale_filter(id_field, name_field, user_id, username)
+    documents = await collection.find(stale, {"_id": 1}, limit=PROPAGATION_BATCH_SIZE).to_list()
+    if not documents:
+        return None
+
+    batch = {"_id": {"$in": [document["_id"] for document in documents]}, **stale}
+    if "." in id_field:
+        array, id_key = id_field.split(".")
+        name_key = name_field.split(".")[1]
+        result = await collection.update_many(
+            batch,
+            {"$set": {f"{array}.$[entry].{name_key}": username}},
+            array_filters=[{f"entry.{id_key}": user_id}],
+        )
+    else:
+        result = await collection.update_many(batch, {"$set": {name_field: username}})
+    return result.modified_count
+
+async def queue_propagation(user_id: str, created_by: str | None = None):
+    await queue_job(PROPAGATION_KIND, created_by or user_id, {"user_id": user_id})
+
+class UsernamePropagator:
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.updated = 0
+        self.repairs_queued = 0
+        self._last_verified = time.monotonic()
+        self._task = None
+
+    def _lease(self) -> datetime:
+        return datetime.now(tz=timezone.utc) + timedelta(seconds=PROPAGATION_LEASE_SECONDS)
+
+    async def process(self, job: dict):
+        job_id = str(job["_id"])
+        user_id = job["params"]["user_id"]
+        for index in range(job.get("checkpoint", 0), len(TARGETS)):
+            renamed = 0
+            while True:
+                # Re-read every batch so a rename made meanwhile wins
+                user = await async_users_collection.find_one({"_id": ObjectId(user_id)}, {"username": 1})
+                if user is None:
+                    await finish_job(job_id, "User no longer exists")
+                    return
+                updated = await rename_batch(TARGETS[index], user_id, user["username"])
+                if updated is None:
+                    break
+                renamed += updated
+                self.updated += updated
+                await record_progress(job_id, updated, updated, [], lease_until=self._lease())
+                await asyncio.sleep(PROPAGATION_PAUSE_SECONDS)
+            await record_progress(job_id, 0, 0, [], checkpoint=index + 1, lease_until=self._lease())
+            # Course listings are cached with the tutor's name in them
+            if renamed and TARGETS[index][0] == "courses":
+                await invalidate("courses")
+        await finish_job(job_id)
+
+    async def verify(self) -> int:
+        """Sample username copies in every target and queue a job for each stale user."""
+        samples = []
+        for collection_name, id_field, name_field in TARGETS:
+            pipeline = [{"$sample": {"size": PROPAGATION_VERIFY_SAMPLE}}]
+            if "." in id_field:
+                pipeline.append({"$unwind": f"${id_field.split('.')[0]}"})
+            pipeline.append({"$project": {"_id": 0, "user_id": f"${id_field}", "username": f"${name_field}"}})
+            cursor = await async_bridgelms_db[collection_name].aggregate(pipeline)
+            samples += await cursor.to_list()
+
+        user_ids = {sample.get("user_id") for sample in samples}
+        users = await async_users_collection.find(
+            {"_id": {"$in": [ObjectId(user_id) for user_id in user_ids if ObjectId.is_valid(user_id)]}},
+            {"username": 1},
+        ).to_list()
+        usernames = {str(user["_id"]): user["username"] for user in users}
+        stale = {
+            sample["user_id"] for sample in samples
+            if sample.get("user_id") in usernames and sample.get("username") != usernames[sample["user_id"]]
+        }
+        for user_id in stale:
+            await queue_propagation(user_id, "verifier")
+        self.repairs_queued += len(stale)
+        return len(stale)
+
+    async def run_once(self) -> bool:
+        if PROPAGATION_VERIFY_SECONDS > 0 and time.monotonic() - self._last_verified >= PROPAGATION_VERIFY_SECONDS:
+            self._last_verified = time.monotonic()
+            if drifted := await self.verify():
+                logger.warning("Found stale username copies for %d users; queued repairs", drifted)
+
+        job = await claim_job(PROPAGATION_KIND, self.owner, PROPAGATION_LEASE_SECONDS)
+        if job is None:
+            return False
+        try:
+            await self.process(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The lease lapses and another pass resumes from the checkpoint
+            logger.exception("Username propagation job %s failed", job["_id"])
+            await record_progress(str(job["_id"]), 0, 0, [], error=str(e))
+        return True
+
+    async def run(self):
+        while True:
+            try:
+                claimed = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Username propagator iteration failed")
+                claimed = False
+            if not claimed:
+                await asyncio.sleep(PROPAGATION_POLL_SECONDS)
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        return {"owner": self.owner, "updated": self.updated, "repairs_queued": self.repairs_queued}
+
+propagator = UsernamePropagator()
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+from db import async_announcements_collection, async_attendance_collection
+
+logger = logging.getLogger(__name__)
+
+# Live course events for push clients.
+#
+# Subscribers get a bounded queue each. A subscriber that falls
+# SUBSCRIBER_QUEUE_SIZE events behind is marked overflowed and its stream is
+# closed, so one slow client can neither block publishers nor grow memory;
+# it simply reconnects.
+#
+# Events reach the broker from one of two sources (PUSH_SOURCE):
+#   local         routes publish directly after writing; single replica and tests
+#   changestream  a relay tails Mongo change streams, so every replica sees
+#                 writes made by every other replica (requires a replica set)
+
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("SUBSCRIBER_QUEUE_SIZE", "100"))
+PUSH_SOURCE = os.getenv("PUSH_SOURCE", "local")
+
+def announcements_channel(course_id: str) -> str:
+    return f"course:{course_id}:announcements"
+
+def attendance_channel(course_id: str) -> str:
+    return f"course:{course_id}:attendance"
+
+class Subscription:
+    def __init__(self, channels: list):
+        self.channels = channels
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+class Broker:
+    def __init__(self):
+        self._subscribers = {}
+
+    def subscribe(self, channels: list) -> Subscription:
+        subscription = Subscription(channels)
+        for channel in channels:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for channel in subscription.channels:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def publish(self, channel: str, event: dict):
+        for subscription in list(self._subscribers.get(channel, ())):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscription.overflowed = True
+
+    def subscriber_count(self) -> int:
+        return len({subscription for subscribers in self._subscribers.values() for subscription in subscribers})
+
+broker = Broker()
+
+def announcement_event(announcement: dict) -> dict:
+    return {"type": "announcement", "data": {
+        "id": str(announcement["_id"]),
+        "title": announcement["title"],
+        "content": announcement["content"],
+        "course_id": announcement["course_id"],
+        "created_by_name": announcement["created_by_name"],
+        "is_important": announcement["is_important"],
+        "created_at": announcement["created_at"].isoformat(),
+    }}
+
+def checkin_event(attendance: dict) -> dict:
+    return {"type": "checkin", "data": {
+        "id": str(attendance["_id"]),
+        "course_id": attendance["course_id"],
+        "learner_id": attendance["learner_id"],
+        "learner_name": attendance["learner_name"],
+        "date": attendance["date"].isoformat(),
+    }}
+
+def publish_announcement(announcement: dict):
+    if PUSH_SOURCE == "local":
+        broker.publish(announcements_channel(announcement["course_id"]), announcement_event(announcement))
+
+def publish_checkins(attendance_records: list):
+    if PUSH_SOURCE == "local":
+        for attendance in attendance_records:
+            broker.publish(attendance_channel(attendance["course_id"]), checkin_event(attendance))
+
+class ChangeStreamRelay:
+    """Feeds the broker from insert change streams, resuming after errors."""
+
+    def __init__(self):
+        self._tasks = []
+
+    async def _relay(self, collection, channel_for, to_event):
+        resume_token = None
+        while True:
+            try:
+                async with await collection.watch(
+                    [{"$match": {"operationType": "insert"}}], resume_after=resume_token
+                ) as stream:
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        document = change["fullDocument"]
+                        broker.publish(channel_for(document["course_id"]), to_event(document))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Change stream on %s failed, retrying", collection.name)
+                await asyncio.sleep(5)
+
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self._relay(async_announcements_collection, announcements_channel, announcement_event)),
+            asyncio.create_task(self._relay(async_attendance_collection, attendance_channel, checkin_event)),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+relay = ChangeStreamRelay()
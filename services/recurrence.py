@@ -0,0 +1,156 @@
+import calendar
+from datetime import datetime, timedelta, timezone
+
+# A small RRULE subset for recurring calendar events:
+#
+#   FREQ=DAILY|WEEKLY|MONTHLY  (required)
+#   INTERVAL=n                 every n days/weeks/months, default 1
+#   BYDAY=MO,WE,FR             WEEKLY only, default the weekday of the start
+#   COUNT=n | UNTIL=YYYYMMDD[THHMMSSZ]
+#
+# Occurrences are computed on demand for the requested window only, and
+# series without COUNT jump straight to the window instead of walking from
+# the first occurrence. Times are UTC.
+
+WEEKDAYS = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+FREQUENCIES = {"DAILY", "WEEKLY", "MONTHLY"}
+MAX_COUNT = 1000
+OPEN_ENDED = datetime(9999, 12, 31, tzinfo=timezone.utc)
+
+def as_utc(moment: datetime) -> datetime:
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+def _parse_until(value: str) -> datetime:
+    for fmt in ("%Y%m%dT%H%M%SZ", "%Y%m%d"):
+        try:
+            until = datetime.strptime(value, fmt).replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+        # A bare date includes the whole day
+        return until + timedelta(days=1) - timedelta(microseconds=1) if fmt == "%Y%m%d" else until
+    raise ValueError(f"Invalid UNTIL value: {value}")
+
+def parse_rrule(rule: str, start: datetime) -> dict:
+    """Validate a rule string and return its normalized parts. Raises ValueError."""
+    parts = {}
+    for item in rule.upper().removeprefix("RRULE:").split(";"):
+        key, _, value = item.partition("=")
+        if not key or not value:
+            raise ValueError(f"Invalid rule part: {item}")
+        parts[key] = value
+
+    freq = parts.pop("FREQ", None)
+    if freq not in FREQUENCIES:
+        raise ValueError("FREQ must be DAILY, WEEKLY or MONTHLY")
+    parsed = {"freq": freq, "interval": int(parts.pop("INTERVAL", "1")), "count": None, "until": None}
+    if parsed["interval"] < 1:
+        raise ValueError("INTERVAL must be at least 1")
+
+    if "COUNT" in parts and "UNTIL" in parts:
+        raise ValueError("COUNT and UNTIL cannot be combined")
+    if "COUNT" in parts:
+        parsed["count"] = int(parts.pop("COUNT"))
+        if not 1 <= parsed["count"] <= MAX_COUNT:
+            raise ValueError(f"COUNT must be between 1 and {MAX_COUNT}")
+    if "UNTIL" in parts:
+        parsed["until"] = _parse_until(parts.pop("UNTIL"))
+
+    byday = parts.pop("BYDAY", None)
+    if byday and freq != "WEEKLY":
+        raise ValueError("BYDAY is only supported with FREQ=WEEKLY")
+    if byday:
+        try:
+            parsed["byday"] = sorted({WEEKDAYS.index(day) for day in byday.split(",")})
+        except ValueError:
+            raise ValueError(f"Invalid BYDAY value: {byday}")
+    else:
+        parsed["byday"] = [as_utc(start).weekday()]
+
+    if parts:
+        raise ValueError(f"Unsupported rule parts: {', '.join(sorted(parts))}")
+    return parsed
+
+def _occurrences(start: datetime, rule: dict, skip_to: datetime | None):
+    """Yield (index, occurrence start) in order; index counts from the series start."""
+    interval = rule["interval"]
+    if rule["freq"] == "DAILY":
+        period = timedelta(days=interval)
+        n = 0
+        if skip_to and skip_to > start:
+            n = (skip_to - start) // period
+        while True:
+            yield n, start + n * period
+            n += 1
+
+    elif rule["freq"] == "WEEKLY":
+        week_start = start - timedelta(days=start.weekday())
+        period = timedelta(weeks=interval)
+        per_week = len(rule["byday"])
+        n = 0
+        if skip_to and skip_to > start:
+            n = (skip_to - week_start) // period
+        # Occurrences before the series start don't count towards the index
+        first_week_skipped = sum(1 for day in rule["byday"] if week_start + timedelta(days=day) < start)
+        while True:
+            base = week_start + n * period
+            for position, day in enumerate(rule["byday"]):
+                occurrence = base + timedelta(days=day)
+                if occurrence >= start:
+                    yield n * per_week + position - first_week_skipped, occurrence
+            n += 1
+
+    else:
+        n = 0
+        if skip_to and skip_to > start:
+            months = (skip_to.year - start.year) * 12 + skip_to.month - start.month
+            n = max(0, months // interval - 1)
+        index = n
+        while True:
+            month_index = start.month - 1 + n * interval
+            year, month = start.year + month_index // 12, month_index % 12 + 1
+            if year > 9999:
+                return
+            # Months without the start's day of month are skipped, as in RFC 5545
+            if start.day <= calendar.monthrange(year, month)[1]:
+                yield index, start.replace(year=year, month=month)
+                index += 1
+            n += 1
+
+def expand(start: datetime, end: datetime, rule: dict | None, window_start: datetime, window_end: datetime, limit: int = 5000) -> list:
+    """(start, end) pairs of the occurrences that overlap the window."""
+    start, end = as_utc(start), as_utc(end)
+    duration = end - start
+    if rule is None:
+        return [(start, end)] if start < window_end and end > window_start else []
+
+    # COUNT is defined from the first occurrence, so only skip when counting isn't needed
+    skip_to = None if rule["count"] else window_start - duration
+    results = []
+    for index, occurrence in _occurrences(start, rule, skip_to):
+        if rule["count"] and index >= rule["count"]:
+            break
+        if rule["until"] and occurrence > rule["until"]:
+            break
+        if occurrence >= window_end or len(results) >= limit:
+            break
+        if occurrence + duration > window_start:
+            results.append((occurrence, occurrence + duration))
+    return results
+
+def series_end(start: datetime, end: datetime, rule: dict | None) -> datetime:
+    """When the last occurrence of a series ends, for range queries."""
+    start, end = as_utc(start), as_utc(end)
+    if rule is None:
+        return end
+    if rule["until"]:
+        return rule["until"] + (end - start)
+    if rule["count"]:
+        last = None
+        for index, occurrence in _occurrences(start, rule, None):
+            if index >= rule["count"]:
+                break
+            last = occurrence
+        return last + (end - start)
+    return OPEN_ENDED
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from fastapi.concurrency import run_in_threadpool
+from pymongo import ReturnDocument
+from db import async_reminders_collection
+
+logger = logging.getLogger(__name__)
+
+# Reminder delivery.
+#
+# Reminders carry a `bucket` (remind_at floored to the minute) so that due
+# reminders are found by an index range over (status, bucket) instead of
+# a scan. Each API replica runs a dispatcher that claims due reminders one
+# at a time with find_one_and_update, stamping a lease with its owner id.
+# A claimed reminder is invisible to other replicas until its lease
+# expires, after which another replica takes it over, so a crashed
+# replica's reminders are retried.
+#
+# Delivery is at-least-once. Right before sending, a dispatcher renews its
+# leases and drops any reminder it no longer holds, and a send is abandoned
+# after REMINDER_SEND_TIMEOUT_SECONDS, well inside the lease. That keeps two
+# replicas from sending the same reminder in the normal case, but a send
+# that outlives its lease anyway (a stalled process, a notifier that
+# finishes after being abandoned) can still be repeated by the replica that
+# takes over. Receivers should drop duplicates by reminder id.
+
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "200"))
+REMINDER_POLL_SECONDS = float(os.getenv("REMINDER_POLL_SECONDS", "5"))
+REMINDER_LEASE_SECONDS = int(os.getenv("REMINDER_LEASE_SECONDS", "60"))
+REMINDER_MAX_ATTEMPTS = int(os.getenv("REMINDER_MAX_ATTEMPTS", "5"))
+REMINDER_SEND_TIMEOUT_SECONDS = float(os.getenv("REMINDER_SEND_TIMEOUT_SECONDS", str(REMINDER_LEASE_SECONDS / 2)))
+
+def reminder_bucket(moment: datetime) -> datetime:
+    return moment.replace(second=0, microsecond=0)
+
+class LogNotifier:
+    async def send(self, reminders: list):
+        for reminder in reminders:
+            logger.info("Reminder for user %s: %s", reminder["user_id"], reminder["message"])
+
+class FileNotifier:
+    """Appends one JSON line per delivered reminder; handy for tests."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _write(self, lines: list):
+        with open(self.path, "a", encoding="utf-8") as sink:
+            sink.writelines(lines)
+
+    async def send(self, reminders: list):
+        lines = [
+            json.dumps({
+                "reminder_id": str(reminder["_id"]),
+                "user_id": reminder["user_id"],
+                "event_id": reminder.get("event_id"),
+                "message": reminder["message"],
+                "remind_at": reminder["remind_at"].isoformat(),
+            }) + "\n"
+            for reminder in reminders
+        ]
+        await run_in_threadpool(self._write, lines)
+
+def get_notifier():
+    if os.getenv("REMINDER_NOTIFIER", "log") == "file":
+        return FileNotifier(os.getenv("REMINDER_SINK_PATH", "reminders.ndjson"))
+    return LogNotifier()
+
+class ReminderDispatcher:
+    def __init__(self, notifier, batch_size: int = REMINDER_BATCH_SIZE):
+        self.notifier = notifier
+        self.batch_size = batch_size
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.sent = 0
+        self.failed = 0
+        self.last_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+        self._recent = deque()
+        self._task = None
+
+    async def claim_batch(self, now: datetime) -> list:
+        lease = {"$set": {
+            "status": "leased",
+            "lease_owner": self.owner,
+            "lease_until": now + timedelta(seconds=REMINDER_LEASE_SECONDS),
+        }}
+        claimed = []
+        while len(claimed) < self.batch_size:
+            reminder = await async_reminders_collection.find_one_and_update(
+                {"status": "pending", "bucket": {"$lte": reminder_bucket(now)}, "remind_at": {"$lte": now}},
+                lease,
+                sort=[("bucket", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if reminder is None:
+                # Take over reminders whose owner died mid-delivery
+                reminder = await async_reminders_collection.find_one_and_update(
+                    {"status": "leased", "lease_until": {"$lt": now}},
+                    lease,
+                    return_document=ReturnDocument.AFTER,
+                )
+            if reminder is None:
+                break
+            claimed.append(reminder)
+        return claimed
+
+    async def renew_leases(self, reminders: list) -> list:
+        """Extend the lease on every reminder still held; returns only those."""
+        ids = [reminder["_id"] for reminder in reminders]
+        held = {"_id": {"$in": ids}, "status": "leased", "lease_owner": self.owner}
+        lease_until = datetime.now(tz=timezone.utc) + timedelta(seconds=REMINDER_LEASE_SECONDS)
+        await async_reminders_collection.update_many(held, {"$set": {"lease_until": lease_until}})
+        # A renewed lease can't be taken over, so what matches now stays ours
+        still_held = {reminder["_id"] for reminder in await async_reminders_collection.find(held, {"_id": 1}).to_list()}
+        return [reminder for reminder in reminders if reminder["_id"] in still_held]
+
+    async def run_once(self) -> int:
+        now = datetime.now(tz=timezone.utc)
+        claimed = await self.claim_batch(now)
+        if not claimed:
+            return 0
+
+        reminders = await self.renew_leases(claimed)
+        if len(reminders) < len(claimed):
+            logger.warning("Lost the lease on %d reminders before sending them", len(claimed) - len(reminders))
+        if not reminders:
+            return 0
+
+        ids = [reminder["_id"] for reminder in reminders]
+        try:
+            await asyncio.wait_for(self.notifier.send(reminders), REMINDER_SEND_TIMEOUT_SECONDS)
+        except Exception:
+            logger.exception("Delivering %d reminders failed", len(reminders))
+            self.failed += len(reminders)
+            await async_reminders_collection.update_many(
+                {"_id": {"$in": ids}, "lease_owner": self.owner},
+                [{"$set": {
+                    "attempts": {"$add": [{"$ifNull": ["$attempts", 0]}, 1]},
+                    "status": {"$cond": [
+                        {"$gte": [{"$add": [{"$ifNull": ["$attempts", 0]}, 1]}, REMINDER_MAX_ATTEMPTS]},
+                        "failed",
+                        "pending",
+                    ]},
+                }}],
+            )
+            return 0
+
+        result = await async_reminders_collection.update_many(
+            {"_id": {"$in": ids}, "lease_owner": self.owner},
+            {"$set": {"status": "sent", "sent_at": datetime.now(tz=timezone.utc)}},
+        )
+        if result.modified_count < len(ids):
+            logger.warning("Lease on %d reminders expired during delivery; they may be sent twice",
+                           len(ids) - result.modified_count)
+        oldest = min(reminder["remind_at"] for reminder in reminders)
+        self.last_lag_seconds = (now - oldest.replace(tzinfo=timezone.utc)).total_seconds()
+        self.max_lag_seconds = max(self.max_lag_seconds, self.last_lag_seconds)
+        self.sent += len(reminders)
+        self._recent.append((time.monotonic(), len(reminders)))
+        return len(reminders)
+
+    async def run(self):
+        while True:
+            try:
+                delivered = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Reminder dispatcher iteration failed")
+                delivered = 0
+            # Keep draining while a deadline backlog remains
+            if delivered < self.batch_size:
+                await asyncio.sleep(REMINDER_POLL_SECONDS)
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        cutoff = time.monotonic() - 60
+        while self._recent and self._recent[0][0] < cutoff:
+            self._recent.popleft()
+        return {
+            "owner": self.owner,
+            "sent": self.sent,
+            "failed": self.failed,
+            "sent_last_minute": sum(count for _, count in self._recent),
+            "last_lag_seconds": self.last_lag_seconds,
+            "max_lag_seconds": self.max_lag_seconds,
+        }
+
+dispatcher = ReminderDispatcher(get_notifier())
@@ -0,0 +1,55 @@
+import os
+import shutil
+import subprocess
+
+# Thumbnail rendering, run inside the derivatives process pool. Spawned
+# workers import this module on their own, so it must not import `db` or
+# anything that does: each worker would otherwise build Mongo clients it
+# never uses.
+
+THUMBNAIL_SIZES = {"small": 128, "medium": 320, "large": 640}
+IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
+VIDEO_EXTENSIONS = {"mp4", "mov"}
+RENDER_TIMEOUT = 60
+
+def _source_image(path: str, extension: str, workdir: str) -> str | None:
+    """Return the path of an image to thumbnail, rendering one if needed."""
+    if extension in IMAGE_EXTENSIONS:
+        return path
+    if extension == "pdf" and shutil.which("pdftoppm"):
+        prefix = os.path.join(workdir, "page")
+        subprocess.run(
+            ["pdftoppm", "-f", "1", "-l", "1", "-png", "-r", "100", "-singlefile", path, prefix],
+            check=True, capture_output=True, timeout=RENDER_TIMEOUT,
+        )
+        return prefix + ".png"
+    if extension in VIDEO_EXTENSIONS and shutil.which("ffmpeg"):
+        poster = os.path.join(workdir, "poster.jpg")
+        subprocess.run(
+            ["ffmpeg", "-y", "-ss", "1", "-i", path, "-frames:v", "1", poster],
+            check=True, capture_output=True, timeout=RENDER_TIMEOUT,
+        )
+        return poster
+    return None
+
+def render(path: str, extension: str, workdir: str) -> dict:
+    """Process pool entry point: write thumbnails into workdir, keyed by size name."""
+    from PIL import Image
+
+    source = _source_image(path, extension, workdir)
+    if not source:
+        return {}
+
+    rendered = {}
+    with Image.open(source) as image:
+        image.seek(0)
+        image = image.convert("RGB")
+        for name, size in THUMBNAIL_SIZES.items():
+            thumbnail = image.copy()
+            thumbnail.thumbnail((size, size))
+            target = os.path.join(workdir, f"{name}.jpg")
+            thumbnail.save(target, "JPEG", quality=85, optimize=True)
+            rendered[name] = target
+    if source != path:
+        rendered["preview"] = source
+    return rendered
@@ -0,0 +1,113 @@
+import os
+import re
+from pymongo import UpdateOne
+from db import courses_collection
+
+# Course catalog search.
+#
+# Courses carry a `search_terms` array (every title/description token) and a
+# `search_fuzzy` array (title tokens plus their single-character deletions).
+# A query token matches a course when it is an anchored prefix of one of its
+# terms, or when one of its own deletions meets a stored deletion, which
+# tolerates one typo. Both fields are multikey-indexed, and user input only
+# ever reaches Mongo as escaped literals.
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+MIN_FUZZY_LENGTH = 4
+MAX_QUERY_TOKENS = 8
+CANDIDATE_LIMIT = int(os.getenv("SEARCH_CANDIDATE_LIMIT", "500"))
+
+def tokenize(text: str) -> list:
+    return TOKEN_PATTERN.findall((text or "").casefold())
+
+def normalize_category(category: str) -> str:
+    return category.strip().casefold()
+
+def _fuzzy_keys(token: str) -> set:
+    keys = {token}
+    if len(token) >= MIN_FUZZY_LENGTH:
+        keys.update(token[:i] + token[i + 1:] for i in range(len(token)))
+    return keys
+
+def search_fields(title: str, description: str, category: str) -> dict:
+    """Denormalized search fields to store alongside a course."""
+    title_terms = set(tokenize(title))
+    fuzzy = set()
+    for term in title_terms:
+        fuzzy |= _fuzzy_keys(term)
+    return {
+        "search_terms": sorted(title_terms | set(tokenize(description))),
+        "search_fuzzy": sorted(fuzzy),
+        "category_key": normalize_category(category),
+    }
+
+def query_tokens(search: str) -> list:
+    return list(dict.fromkeys(tokenize(search)))[:MAX_QUERY_TOKENS]
+
+def search_filter(tokens: list, fuzzy: bool = True) -> dict:
+    """Every token must prefix-match a term or fuzzy-match a title term."""
+    clauses = []
+    for token in tokens:
+        options = [{"search_terms": {"$regex": f"^{re.escape(token)}"}}]
+        if fuzzy and len(token) >= MIN_FUZZY_LENGTH:
+            options.append({"search_fuzzy": {"$in": sorted(_fuzzy_keys(token))}})
+        clauses.append({"$or": options})
+    return {"$and": clauses}
+
+def search_tiers(tokens: list) -> list:
+    """Filters from strongest to weakest match: exact title terms, exact
+    terms anywhere, prefixes, then typos.
+
+    Candidates are gathered tier by tier up to CANDIDATE_LIMIT, so when a
+    broad query has more matches than that, the cap cuts the weakest ones.
+    Title terms are looked up in search_fuzzy, which holds each of them
+    verbatim next to its deletions.
+    """
+    tiers = [
+        {"search_fuzzy": {"$all": tokens}},
+        {"search_terms": {"$all": tokens}},
+        search_filter(tokens, fuzzy=False),
+    ]
+    if any(len(token) >= MIN_FUZZY_LENGTH for token in tokens):
+        tiers.append(search_filter(tokens))
+    return tiers
+
+def _token_score(token: str, terms: set, fuzzy: bool = True) -> float:
+    if token in terms:
+        return 1.0
+    if any(term.startswith(token) for term in terms):
+        return 0.6
+    if fuzzy and any(_fuzzy_keys(token) & _fuzzy_keys(term) for term in terms):
+        return 0.3
+    return 0.0
+
+def relevance(course: dict, tokens: list) -> float:
+    """Title matches weigh three times as much as description matches."""
+    title_terms = set(tokenize(course.get("title", "")))
+    description_terms = set(tokenize(course.get("description", "")))
+    return sum(
+        3 * _token_score(token, title_terms) + _token_score(token, description_terms, fuzzy=False)
+        for token in tokens
+    )
+
+def reindex_courses(batch_size: int = 1000) -> int:
+    """Backfill search fields for courses created before search existed."""
+    updated = 0
+    batch = []
+    cursor = courses_collection.find(
+        {"search_terms": {"$exists": False}},
+        {"title": 1, "description": 1, "category": 1},
+    )
+    for course in cursor:
+        fields = search_fields(course["title"], course["description"], course["category"])
+        batch.append(UpdateOne({"_id": course["_id"]}, {"$set": fields}))
+        if len(batch) >= batch_size:
+            updated += courses_collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += courses_collection.bulk_write(batch, ordered=False).modified_count
+    return updated
+
+if __name__ == "__main__":
+    # Usage: python -m services.search
+    print(f"Reindexed {reindex_courses()} courses")
@@ -0,0 +1,54 @@
+import os
+import shutil
+import uuid
+from functools import lru_cache
+import cloudinary
+import cloudinary.uploader
+
+# Pluggable blob storage for uploaded resources. Backends are synchronous
+# and are called from a worker thread, never from the event loop.
+#
+#   STORAGE_BACKEND=cloudinary  (default) chunked uploads to Cloudinary
+#   STORAGE_BACKEND=local       files under LOCAL_STORAGE_DIR, served from LOCAL_STORAGE_URL
+
+class CloudinaryStorage:
+    chunk_size = 20 * 1024 * 1024
+
+    def save(self, path: str, filename: str) -> dict:
+        result = cloudinary.uploader.upload_large(
+            path, resource_type="auto", chunk_size=self.chunk_size
+        )
+        return {
+            "url": result["secure_url"],
+            "key": result["public_id"],
+            "resource_type": result.get("resource_type", "raw"),
+        }
+
+    def delete(self, stored: dict):
+        cloudinary.uploader.destroy(stored["key"], resource_type=stored.get("resource_type", "raw"))
+
+class LocalStorage:
+    def __init__(self, root: str, base_url: str):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+        os.makedirs(root, exist_ok=True)
+
+    def save(self, path: str, filename: str) -> dict:
+        key = f"{uuid.uuid4().hex}-{os.path.basename(filename)}"
+        shutil.copyfile(path, os.path.join(self.root, key))
+        return {"url": f"{self.base_url}/{key}", "key": key}
+
+    def delete(self, stored: dict):
+        try:
+            os.remove(os.path.join(self.root, stored["key"]))
+        except FileNotFoundError:
+            pass
+
+@lru_cache(maxsize=1)
+def get_storage():
+    if os.getenv("STORAGE_BACKEND", "cloudinary") == "local":
+        return LocalStorage(
+            os.getenv("LOCAL_STORAGE_DIR", "uploads"),
+            os.getenv("LOCAL_STORAGE_URL", "/uploads"),
+        )
+    return CloudinaryStorage()
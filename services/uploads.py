@@ -0,0 +1,249 @@
+import hashlib
+import logging
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from contextlib import aclosing
+from fastapi import HTTPException, Request, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pymongo import ReturnDocument
+from starlette.datastructures import FormData
+from starlette.formparsers import MultiPartException, MultiPartParser
+from db import async_blobs_collection, async_resources_collection
+from services.derivatives import build_derivatives, delete_derivatives
+from services.metrics import timed
+from services.storage import get_storage
+from utils import RESOURCE_FILE_TYPES, SIGNATURE_LENGTH, file_extension, validate_file_type
+
+logger = logging.getLogger(__name__)
+
+# Stored files are content-addressed. Each distinct file has one document in
+# `blobs` (keyed by its SHA-256) holding the storage location and the number
+# of resources that reference it. Uploading known content only adds a
+# reference; the stored object is deleted with its last reference.
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(2 * 1024 ** 3)))
+# Multipart framing and the other form fields need a little room on top
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(MAX_UPLOAD_BYTES + 1024 ** 2)))
+# A pending blob whose uploader hasn't finished within this long is assumed
+# lost with its replica, and the next upload of the same content stores it
+BLOB_LEASE_SECONDS = int(os.getenv("BLOB_LEASE_SECONDS", "1800"))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+class RequestSizeLimitMiddleware:
+    """Refuse request bodies over MAX_REQUEST_BYTES before they are parsed.
+
+    Starlette spools a whole multipart body to disk before any handler
+    runs, so a size check in the handler only fires after the client has
+    sent everything. A declared Content-Length over the limit is refused
+    straight away, and a chunked body is cut off once it crosses it.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_REQUEST_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            response = JSONResponse({"detail": "Request body is too large"}, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "Request body is too large")
+            return message
+
+        await self.app(scope, receive_limited, send)
+
+class NamedFileParser(MultiPartParser):
+    """Multipart parser that spools file parts to named temp files.
+
+    Starlette spools to anonymous temp files, which storage backends and
+    the derivative renderer can't open by path. A named file lets the
+    upload be used where it landed instead of being copied again. It is
+    deleted when the form is closed, which FastAPI does only after the
+    response's background tasks have run.
+    """
+
+    def on_headers_finished(self):
+        super().on_headers_finished()
+        upload = self._current_part.file
+        if upload is not None:
+            self._files_to_close_on_error.remove(upload.file)
+            upload.file = tempfile.NamedTemporaryFile(prefix="bridgelms-")
+            self._files_to_close_on_error.append(upload.file)
+
+class UploadRequest(Request):
+    """Request whose multipart form is parsed by NamedFileParser."""
+
+    async def form(self, **options) -> FormData:
+        if self._form is None and self.headers.get("content-type", "").startswith("multipart/form-data"):
+            try:
+                async with aclosing(self.stream()) as stream:
+                    self._form = await NamedFileParser(self.headers, stream, **options).parse()
+            except MultiPartException as e:
+                raise HTTPException(status.HTTP_400_BAD_REQUEST, e.message)
+        return await super().form(**options)
+
+class UploadRoute(APIRoute):
+    """Route class for endpoints that keep uploaded files by path."""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def upload_handler(request: Request):
+            return await handler(UploadRequest(request.scope, request.receive))
+
+        return upload_handler
+
+async def receive_upload(file: UploadFile, resource_type: str) -> tuple:
+    """Validate a file spooled by NamedFileParser and hash it in place.
+
+    Returns (path, size, sha256 hex digest). The path stays valid until the
+    request's background tasks have finished. The size and type are checked
+    before the file is read through for its hash.
+    """
+    size = file.size or 0
+    if size == 0:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Uploaded file is empty")
+    if size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "File is too large")
+    filename = file.filename or ""
+    if not validate_file_type(filename, await file.read(SIGNATURE_LENGTH)):
+        raise HTTPException(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, "Unsupported file type")
+    if file_extension(filename) not in RESOURCE_FILE_TYPES[resource_type]:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, f"File type does not match resource type {resource_type}")
+
+    await file.seek(0)
+    digest = hashlib.sha256()
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        digest.update(chunk)
+    return file.file.name, size, digest.hexdigest()
+
+async def acquire_blob(content_hash: str, size: int) -> tuple:
+    """Add a reference to the blob for this content.
+
+    Returns (blob, should_upload). The caller that creates the blob, or
+    that finds a previous upload of it failed or stalled, is responsible
+    for storing it.
+    """
+    now = datetime.now(tz=timezone.utc)
+    lease_until = now + timedelta(seconds=BLOB_LEASE_SECONDS)
+    blob = await async_blobs_collection.find_one_and_update(
+        {"_id": content_hash},
+        {
+            "$inc": {"ref_count": 1},
+            "$setOnInsert": {"status": "pending", "size": size, "created_at": now, "lease_until": lease_until},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    if blob["status"] == "pending" and blob["ref_count"] == 1:
+        return blob, True
+    if blob["status"] in ["pending", "failed"]:
+        retry = await async_blobs_collection.update_one(
+            {"_id": content_hash, "$or": [
+                {"status": "failed"},
+                {"status": "pending", "lease_until": {"$lt": now}},
+                {"status": "pending", "lease_until": None},
+            ]},
+            {"$set": {"status": "pending", "lease_until": lease_until}},
+        )
+        return blob, retry.modified_count == 1
+    return blob, False
+
+async def settle_resource(resource_id, content_hash: str) -> str:
+    """Copy the blob's outcome onto a resource inserted while it was pending.
+
+    The upload that stores a blob updates every pending resource when it
+    finishes, so a duplicate inserted just after that point would otherwise
+    stay pending. Returns the resource's status.
+    """
+    blob = await async_blobs_collection.find_one({"_id": content_hash}, {"status": 1, "file_url": 1})
+    if not blob or blob["status"] == "pending":
+        return "pending"
+    await async_resources_collection.update_one(
+        {"_id": resource_id, "status": "pending"},
+        {"$set": {"status": blob["status"], "file_url": blob.get("file_url")}},
+    )
+    return blob["status"]
+
+async def release_blob(content_hash: str):
+    """Drop one reference, deleting the stored object when none remain."""
+    blob = await async_blobs_collection.find_one_and_update(
+        {"_id": content_hash},
+        {"$inc": {"ref_count": -1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not blob or blob["ref_count"] > 0:
+        return
+    # A concurrent upload may have re-referenced it in the meantime
+    deleted = await async_blobs_collection.delete_one({"_id": content_hash, "ref_count": {"$lte": 0}})
+    if deleted.deleted_count:
+        if blob.get("storage"):
+            await run_in_threadpool(get_storage().delete, blob["storage"])
+        await delete_derivatives(content_hash)
+
+async def release_resource_file(resource: dict):
+    """Release whatever a deleted resource kept in storage."""
+    if resource.get("storage"):
+        # Uploaded before content addressing: the resource owns its object
+        await run_in_threadpool(get_storage().delete, resource["storage"])
+    elif resource.get("content_hash"):
+        await release_blob(resource["content_hash"])
+
+async def store_resource_file(path: str, filename: str, content_hash: str, upload: bool):
+    """Background job: store new content if needed, then build its derivatives.
+
+    Every resource still pending on this content is marked ready (or failed)
+    together, which covers duplicates uploaded while the first copy was
+    still being transferred. A successful retry also recovers resources a
+    failed attempt marked failed. If the last reference went away while the
+    file was being stored, the stored object is deleted again.
+
+    `path` is the spooled upload from receive_upload, which the request
+    removes once this has run.
+    """
+    if upload:
+        try:
+            with timed("storage"):
+                stored = await run_in_threadpool(get_storage().save, path, filename)
+        except Exception:
+            logger.exception("Storing content %s failed", content_hash)
+            await async_blobs_collection.update_one({"_id": content_hash}, {"$set": {"status": "failed"}})
+            await async_resources_collection.update_many(
+                {"content_hash": content_hash, "status": "pending"}, {"$set": {"status": "failed"}}
+            )
+            return
+        # Only a blob that is still referenced may claim the stored object
+        blob = await async_blobs_collection.find_one_and_update(
+            {"_id": content_hash, "ref_count": {"$gt": 0}, "storage": {"$exists": False}},
+            {"$set": {"status": "ready", "file_url": stored["url"], "storage": stored}},
+        )
+        if blob is None:
+            # Every resource was deleted mid-upload, or a retry stored it first
+            logger.info("Discarding stored copy of unreferenced content %s", content_hash)
+            await run_in_threadpool(get_storage().delete, stored)
+            return
+        # Resources marked failed by an earlier attempt recover too
+        await async_resources_collection.update_many(
+            {"content_hash": content_hash, "status": {"$in": ["pending", "failed"]}},
+            {"$set": {"status": "ready", "file_url": stored["url"]}},
+        )
+
+    try:
+        await build_derivatives(path, filename, content_hash)
+    except Exception:
+        logger.exception("Building derivatives for content %s failed", content_hash)
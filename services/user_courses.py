@@ -0,0 +1,101 @@
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from db import async_courses_collection, async_enrollments_collection, async_user_courses_collection
+from utils import replace_mongo_id
+
+# Materialized "my courses" per user.
+#
+# `user_courses` holds one document per user ({_id: user_id, courses: [...]})
+# with a summary of every course they teach or are actively enrolled in, so
+# the dashboard is a single _id lookup. Course and enrollment writes patch
+# existing documents in place; a missing document is rebuilt on first read
+# with one aggregation. Every write also bumps the document's `version`,
+# leaving a stub without `courses` when there is no document yet, and a
+# rebuild only stores its result if the version it started from is still
+# current. A write that lands while a rebuild is reading can therefore
+# never be overwritten by the rebuild's older view. A TTL index drops
+# documents a day after they were built.
+
+COURSE_SUMMARY_PROJECTION = {
+    "title": 1,
+    "description": 1,
+    "category": 1,
+    "max_students": 1,
+    "is_public": 1,
+    "tutor_id": 1,
+    "tutor_name": 1,
+    "created_at": 1,
+    "is_active": 1,
+}
+
+def course_summary(course: dict) -> dict:
+    summary = {field: course[field] for field in COURSE_SUMMARY_PROJECTION if field in course}
+    summary["id"] = str(course["_id"])
+    return summary
+
+def _bump() -> dict:
+    return {"$inc": {"version": 1}, "$setOnInsert": {"refreshed_at": datetime.now(tz=timezone.utc)}}
+
+async def add_user_course(user_id: str, course: dict):
+    summary = course_summary(course)
+    await async_user_courses_collection.update_one({"_id": user_id}, _bump(), upsert=True)
+    # The filter skips stubs and courses already listed, so repeats are harmless
+    await async_user_courses_collection.update_one(
+        {"_id": user_id, "courses": {"$exists": True}, "courses.id": {"$ne": summary["id"]}},
+        {"$push": {"courses": summary}},
+    )
+
+async def remove_user_course(user_id: str, course_id: str):
+    await async_user_courses_collection.update_one({"_id": user_id}, _bump(), upsert=True)
+    await async_user_courses_collection.update_one({"_id": user_id}, {"$pull": {"courses": {"id": course_id}}})
+
+async def invalidate_user_courses(user_id: str):
+    await invalidate_many_user_courses([user_id])
+
+async def invalidate_many_user_courses(user_ids: list):
+    """Drop the course lists so the next read rebuilds them."""
+    if user_ids:
+        await async_user_courses_collection.bulk_write(
+            [UpdateOne({"_id": user_id}, {"$unset": {"courses": ""}, **_bump()}, upsert=True) for user_id in user_ids],
+            ordered=False,
+        )
+
+async def rebuild_user_courses(user: dict, version: int | None) -> list:
+    if user["role"] in ["admin", "tutor"]:
+        courses = await async_courses_collection.find(
+            {"tutor_id": user["id"]}, COURSE_SUMMARY_PROJECTION
+        ).to_list()
+    else:
+        cursor = await async_enrollments_collection.aggregate([
+            {"$match": {"learner_id": user["id"], "status": "active"}},
+            {"$project": {"_id": 0, "course_id": {"$toObjectId": "$course_id"}}},
+            {"$lookup": {
+                "from": "courses",
+                "localField": "course_id",
+                "foreignField": "_id",
+                "pipeline": [{"$project": COURSE_SUMMARY_PROJECTION}],
+                "as": "course",
+            }},
+            {"$unwind": "$course"},
+            {"$replaceWith": "$course"},
+        ])
+        courses = await cursor.to_list()
+
+    summaries = list(map(replace_mongo_id, courses))
+    # Store only if no write bumped the version while the sources were read
+    try:
+        await async_user_courses_collection.replace_one(
+            {"_id": user["id"], "version": version if version is not None else {"$exists": False}},
+            {"courses": summaries, "version": version or 0, "refreshed_at": datetime.now(tz=timezone.utc)},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        pass
+    return summaries
+
+async def user_courses(user: dict) -> list:
+    materialized = await async_user_courses_collection.find_one({"_id": user["id"]}, {"courses": 1, "version": 1})
+    if materialized is None or "courses" not in materialized:
+        return await rebuild_user_courses(user, materialized and materialized.get("version"))
+    return materialized["courses"]
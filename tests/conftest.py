@@ -0,0 +1,65 @@
+import os
+from datetime import datetime, timedelta, timezone
+import jwt
+import pytest
+
+# Tests that need MongoDB run against MONGO_URI in a scratch database that
+# is dropped before each session, and are skipped when no server answers.
+os.environ["MONGO_DB_NAME"] = os.getenv("TEST_MONGO_DB_NAME", "bridgelms_test")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-test-secret-key-test")
+os.environ["REMINDER_DISPATCHER"] = "off"
+os.environ["PROPAGATION_WORKER"] = "off"
+os.environ["IMPORT_WORKER"] = "off"
+
+def token_headers(user_id: str, role: str) -> dict:
+    token = jwt.encode(
+        {"id": user_id, "role": role, "ver": 0, "exp": datetime.now(tz=timezone.utc) + timedelta(hours=1)},
+        os.environ["JWT_SECRET_KEY"],
+        "HS256",
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture(scope="session")
+def mongo():
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+    from db import MONGO_DB_NAME, mongo_client
+
+    probe = MongoClient(os.getenv("MONGO_URI"), serverSelectionTimeoutMS=2000)
+    try:
+        probe.admin.command("ping")
+    except PyMongoError as e:
+        pytest.skip(f"MongoDB is not reachable: {e}")
+    finally:
+        probe.close()
+    mongo_client.drop_database(MONGO_DB_NAME)
+    return mongo_client[MONGO_DB_NAME]
+
+@pytest.fixture(scope="session")
+def client(mongo):
+    from fastapi.testclient import TestClient
+    from main import app
+
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture
+def make_users(mongo):
+    """Insert users directly (skipping bcrypt) and return their auth headers."""
+    def make_users(role: str, count: int) -> list:
+        now = datetime.now(tz=timezone.utc)
+        result = mongo["users"].insert_many([
+            {
+                "username": f"{role.title()} {i}",
+                "email": f"{role}-{now.timestamp()}-{i}@test.local",
+                "password": b"",
+                "role": role,
+                "phone": "",
+                "bio": "",
+                "created_at": now,
+            }
+            for i in range(count)
+        ])
+        return [token_headers(str(user_id), role) for user_id in result.inserted_ids]
+
+    return make_users
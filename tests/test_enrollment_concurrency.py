@@ -0,0 +1,91 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+from bson.objectid import ObjectId
+
+# Many learners race for a handful of seats. The conditional $inc on
+# enrolled_count is the only thing standing between them and an
+# overbooked course, so these hit one course from hundreds of threads.
+
+SEATS = 20
+LEARNERS = 300
+
+def create_course(client, tutor: dict) -> str:
+    response = client.post(
+        "/courses",
+        headers=tutor,
+        data={"title": "Stress", "description": "Seat race", "category": "Testing", "max_students": SEATS},
+    )
+    assert response.status_code == 200, response.text
+    return response.json()["course_id"]
+
+def hammer(requests: list) -> list:
+    with ThreadPoolExecutor(max_workers=len(requests)) as pool:
+        return list(pool.map(lambda request: request(), requests))
+
+def assert_not_overbooked(mongo, course_id: str):
+    enrollments = list(mongo["enrollments"].find({"course_id": course_id}))
+    active = sum(enrollment["status"] == "active" for enrollment in enrollments)
+    course = mongo["courses"].find_one({"_id": ObjectId(course_id)})
+    assert active <= SEATS
+    assert course["enrolled_count"] == active
+    assert len({enrollment["learner_id"] for enrollment in enrollments}) == len(enrollments)
+    return active
+
+def test_concurrent_enrollment_fills_exactly_the_seats(client, mongo, make_users):
+    course_id = create_course(client, make_users("tutor", 1)[0])
+    learners = make_users("learner", LEARNERS)
+
+    responses = hammer([
+        lambda headers=headers: client.post(f"/courses/{course_id}/enroll", headers=headers)
+        for headers in learners
+    ])
+
+    assert all(response.status_code == 200 for response in responses)
+    statuses = [response.json()["status"] for response in responses]
+    assert statuses.count("active") == SEATS
+    assert statuses.count("waitlisted") == LEARNERS - SEATS
+    assert assert_not_overbooked(mongo, course_id) == SEATS
+
+def test_concurrent_enroll_and_unenroll_never_overbook(client, mongo, make_users):
+    course_id = create_course(client, make_users("tutor", 1)[0])
+    learners = make_users("learner", LEARNERS)
+    hammer([
+        lambda headers=headers: client.post(f"/courses/{course_id}/enroll", headers=headers)
+        for headers in learners[:LEARNERS // 2]
+    ])
+
+    # Leavers free seats (and promote the waitlist) while newcomers and
+    # repeat requests compete for the same seats
+    rng = random.Random(8)
+    leavers = rng.sample(learners[:LEARNERS // 2], LEARNERS // 4)
+    requests = [
+        lambda headers=headers: client.delete(f"/courses/{course_id}/enroll", headers=headers) for headers in leavers
+    ] + [
+        lambda headers=headers: client.post(f"/courses/{course_id}/enroll", headers=headers)
+        for headers in learners[LEARNERS // 2:] + rng.sample(learners[:LEARNERS // 2], 30)
+    ]
+    rng.shuffle(requests)
+    responses = hammer(requests)
+
+    assert all(response.status_code in (200, 404, 409) for response in responses)
+    assert_not_overbooked(mongo, course_id)
+
+def test_freed_seats_go_to_the_waitlist(client, mongo, make_users):
+    course_id = create_course(client, make_users("tutor", 1)[0])
+    holders = make_users("learner", SEATS)
+    newcomers = make_users("learner", SEATS)
+    hammer([lambda headers=headers: client.post(f"/courses/{course_id}/enroll", headers=headers) for headers in holders])
+
+    # Newcomers find the course full while every seat holder leaves. A seat
+    # freed between a newcomer's failed reservation and its joining the
+    # waitlist must still reach the waitlist: there are as many newcomers as
+    # seats, so no later enrollment comes along to take it
+    responses = hammer([
+        lambda headers=headers: client.post(f"/courses/{course_id}/enroll", headers=headers) for headers in newcomers
+    ] + [
+        lambda headers=headers: client.delete(f"/courses/{course_id}/enroll", headers=headers) for headers in holders
+    ])
+
+    assert all(response.status_code == 200 for response in responses)
+    assert mongo["enrollments"].count_documents({"course_id": course_id, "status": "waitlisted"}) == 0
+    assert assert_not_overbooked(mongo, course_id) == SEATS
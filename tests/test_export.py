@@ -0,0 +1,60 @@
+import asyncio
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+import pytest
+from bson.objectid import ObjectId
+from utils import export_response
+
+# Exports stream rows as the cursor yields them. A generator-backed cursor
+# stands in for Mongo, so a million rows cost nothing to hold, and the
+# traced peak shows whether the response buffers them.
+
+ROWS = 1_000_000
+FIELDS = ["id", "course_id", "learner_id", "learner_name", "date", "status"]
+MAX_PEAK_BYTES = 16 * 1024 ** 2
+
+class FakeCursor:
+    """Yields `rows` documents drawn from a small pool built up front."""
+
+    def __init__(self, rows: int, pool: int = 1000):
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        course_id = str(ObjectId())
+        self.rows = rows
+        self.pool = [
+            {
+                "_id": ObjectId(),
+                "course_id": course_id,
+                "learner_id": str(ObjectId()),
+                "learner_name": f"Learner {i}",
+                "date": start + timedelta(seconds=i),
+                "status": "present",
+            }
+            for i in range(pool)
+        ]
+
+    async def __aiter__(self):
+        for i in range(self.rows):
+            yield self.pool[i % len(self.pool)]
+
+async def drain(response) -> tuple:
+    size = lines = 0
+    async for chunk in response.body_iterator:
+        size += len(chunk)
+        lines += chunk.count("\n")
+    return size, lines
+
+@pytest.mark.parametrize("export_format", ["csv", "ndjson"])
+def test_export_memory_stays_flat(export_format):
+    response = export_response(FakeCursor(ROWS), FIELDS, export_format, "attendance")
+
+    tracemalloc.start()
+    try:
+        size, lines = asyncio.run(drain(response))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert lines == ROWS + (export_format == "csv")
+    # The output is well over 100 MB; only a batch of it may be held at once
+    assert size > 100 * 1024 ** 2
+    assert peak < MAX_PEAK_BYTES, f"peak {peak / 1024 ** 2:.1f} MiB"
@@ -1,5 +1,18 @@
+import base64
+import csv
+import io
+import json
 import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Annotated, Generic, TypeVar
+from bson import ObjectId, json_util
 from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from pydantic import AliasChoices, BaseModel, BeforeValidator, Field
 
 load_dotenv()
 
@@ -9,15 +22,209 @@ def replace_mongo_id(doc):
         del doc["_id"]
     return doc
 
-# Optional: Add file validation utilities
+# Response models validate Mongo documents as they come back from a query:
+# `_id` is accepted for `id` and ObjectIds become strings on the way in, so
+# handlers return query results untouched and FastAPI renders the response
+# straight to JSON bytes with pydantic-core in a single pass.
+MongoId = Annotated[str, BeforeValidator(str)]
+
+class MongoModel(BaseModel):
+    id: MongoId = Field(validation_alias=AliasChoices("_id", "id"))
+
+Item = TypeVar("Item")
+
+class Listing(BaseModel, Generic[Item]):
+    data: list[Item]
+
+class Page(Listing[Item], Generic[Item]):
+    next_cursor: str | None = None
+
+# Keyset pagination. Listings are sorted descending on `fields` (which must
+# end with `_id` to be unique), and the cursor is an opaque token holding
+# the sort values of the last document on the page.
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "100"))
+
+def page_size(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str, length: int) -> list:
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        values = None
+    if not isinstance(values, list) or len(values) != length:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid cursor")
+    return values
+
+def keyset_filter(query_filter: dict, fields: list, cursor: str | None) -> dict:
+    """Restrict `query_filter` to documents sorted after the cursor."""
+    if not cursor:
+        return query_filter
+    values = decode_cursor(cursor, len(fields))
+    clauses = []
+    for i, field in enumerate(fields):
+        clause = {fields[j]: values[j] for j in range(i)}
+        clause[field] = {"$lt": values[i]}
+        clauses.append(clause)
+    return {"$and": [query_filter, {"$or": clauses}]}
+
+def keyset_sort(fields: list) -> list:
+    return [(field, -1) for field in fields]
+
+def next_cursor(docs: list, limit: int, fields: list) -> str | None:
+    """Given up to `limit + 1` documents, trim the extra one and return the next cursor."""
+    if len(docs) <= limit:
+        return None
+    del docs[limit:]
+    return encode_cursor([docs[-1][field] for field in fields])
+
+# Streaming exports. Rows are pulled from an async cursor in batches and
+# written out as they arrive, so memory stays flat whatever the row count.
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+def _export_row(doc: dict, fields: list) -> list:
+    row = []
+    for field in fields:
+        value = doc.get("_id" if field == "id" else field)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, ObjectId):
+            value = str(value)
+        row.append(value)
+    return row
+
+async def _stream_ndjson(cursor, fields: list):
+    lines = []
+    async for doc in cursor:
+        lines.append(json.dumps(dict(zip(fields, _export_row(doc, fields)))))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+async def _stream_csv(cursor, fields: list):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    rows = 0
+    async for doc in cursor:
+        writer.writerow(_export_row(doc, fields))
+        rows += 1
+        if rows >= EXPORT_BATCH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    yield buffer.getvalue()
+
+def export_response(cursor, fields: list, export_format: str, filename: str) -> StreamingResponse:
+    stream = _stream_csv if export_format == "csv" else _stream_ndjson
+    return StreamingResponse(
+        stream(cursor, fields),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'},
+    )
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+            }
+
+# File validation utilities
 ALLOWED_FILE_TYPES = {
     "pdf": "application/pdf",
     "doc": "application/msword",
     "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
     "mp4": "video/mp4",
-    "mov": "video/quicktime"
+    "mov": "video/quicktime",
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "gif": "image/gif",
+    "webp": "image/webp"
+}
+
+# Leading bytes each allowed extension must start with
+FILE_SIGNATURES = {
+    "pdf": [(0, b"%PDF-")],
+    "doc": [(0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1")],
+    "docx": [(0, b"PK\x03\x04")],
+    "mp4": [(4, b"ftyp")],
+    "mov": [(4, b"ftyp"), (4, b"moov"), (4, b"mdat"), (4, b"wide"), (4, b"free"), (4, b"skip")],
+    "png": [(0, b"\x89PNG\r\n\x1a\n")],
+    "jpg": [(0, b"\xff\xd8\xff")],
+    "jpeg": [(0, b"\xff\xd8\xff")],
+    "gif": [(0, b"GIF87a"), (0, b"GIF89a")],
+    "webp": [(8, b"WEBP")],
 }
+SIGNATURE_LENGTH = 16
+
+# File extensions each uploadable resource_type accepts
+RESOURCE_FILE_TYPES = {
+    "pdf": {"pdf"},
+    "document": {"pdf", "doc", "docx"},
+    "video": {"mp4", "mov"},
+    "image": {"png", "jpg", "jpeg", "gif", "webp"},
+}
+
+def file_extension(filename: str) -> str:
+    return filename.rsplit('.', 1)[-1].lower() if '.' in filename else ""
 
-def validate_file_type(file_type: str, filename: str) -> bool:
-    extension = filename.split('.')[-1].lower()
-    return extension in ALLOWED_FILE_TYPES and ALLOWED_FILE_TYPES[extension] == file_type
\ No newline at end of file
+def validate_file_type(filename: str, header: bytes) -> bool:
+    """Check the extension is allowed and the content actually looks like it."""
+    extension = file_extension(filename)
+    return extension in ALLOWED_FILE_TYPES and any(
+        header[offset:offset + len(magic)] == magic
+        for offset, magic in FILE_SIGNATURES[extension]
+    )